@@ -0,0 +1,95 @@
+"""
+Parse throughput benchmark (lines per second of parse_file).
+
+    python bench/bench_parse.py [--lines N] [--repeat R] [SRC_DIR ...]
+
+Each SRC_DIR (default: src) is timed in its own interpreter, so an older checkout can be compared with the current
+one, e.g.:
+
+    git worktree add /tmp/qu-old <rev>
+    python bench/bench_parse.py src /tmp/qu-old/src
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+HEADER = [
+    "[PO] Project One:: Docs:: http://docs.example.com ORDER<a>",
+    "[PT] Project Two:: Infra:: POSTFIX<(.)>",
+    "[PH] Project Three:: POSTFIX<weekly sync> ORDER<zz>",
+    "",
+]
+TASKS = ["PO::", "PT::", "PH::", "Project One:: Docs:: Chapter {i}::", "Project Four:: Sub {i}:: Leaf {j}::", "Misc::",
+         "PO:"]
+UPDATES = ["worked on it", "met SIM:https://blah.com/x?y=1 about (foo)", "done it (.)", "paused (,)", "waiting (!)",
+           "see docs.google.com/abc/d(e).", "fixed bug #12"]
+
+
+def synthetic_log(n_lines, seed=0, ascending=False):
+    '''
+    An update file with roughly n_lines lines: an alias header and date blocks with comments, comment blocks and TODOs.
+    '''
+    rnd = random.Random(seed)
+    blocks = []
+    day = date(2000, 1, 1)
+    lines = len(HEADER)
+    while lines < n_lines:
+        block = [f"# {day.isoformat()}"]
+        for _ in range(rnd.randint(1, 12)):
+            task = rnd.choice(TASKS).format(i=rnd.randint(1, 30), j=rnd.randint(1, 5))
+            block.append(f"{task} {rnd.choice(UPDATES)}")
+        if rnd.random() < 0.05:
+            block += ["###", "commented out:: text", "###"]
+        if rnd.random() < 0.05:
+            block += ["# a comment", f"#TODO something {day}"]
+        block.append("")
+        blocks.append(block)
+        lines += len(block)
+        day += timedelta(days=rnd.randint(1, 3))
+    if not ascending:
+        blocks.reverse()
+    return "\n".join(HEADER + [line for block in blocks for line in block])
+
+
+def child(src_dir, n_lines, repeat):
+    sys.path.insert(0, src_dir)
+    import parsing
+
+    text = synthetic_log(n_lines)
+    n_lines = text.count("\n") + 1
+    best = None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            t0 = time.perf_counter()
+            parsing.parse_file(text)
+            elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{n_lines / best:12,.0f} lines/s  ({n_lines} lines in {best * 1000:.1f} ms)  {src_dir}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Parse throughput benchmark")
+    ap.add_argument("src_dirs", nargs="*", default=[SRC_DIR])
+    ap.add_argument("--lines", type=int, default=50000)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--child", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        child(args.child, args.lines, args.repeat)
+        return
+    for src_dir in args.src_dirs:
+        subprocess.run([sys.executable, __file__, "--child", os.path.abspath(src_dir), "--lines", str(args.lines),
+                        "--repeat", str(args.repeat)], check=True)
+
+
+if __name__ == "__main__":
+    main()
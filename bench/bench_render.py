@@ -0,0 +1,110 @@
+"""
+Render phase benchmark: formatting the weekly reports of a synthetic update log (report trees) and its task list
+(report lines), with the memoized formatters and with the former ones. Only the writing of the reports is timed. The
+task list formats each task once, its formatters are not memoized.
+
+    python bench/bench_render.py [--lines N] [--repeat R]
+
+Both use the lite engine on the log of bench_parse.py (a few hundred tasks updated every week). The output is checked
+to be identical.
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+from bench_parse import synthetic_log
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+import lite  # noqa: E402
+import parsing  # noqa: E402
+import reporttree  # noqa: E402
+import utils  # noqa: E402
+from utils import this_week_span  # noqa: E402
+
+
+def legacy_format_task(str):
+    tasks = [utils.upper_first(x) for x in parsing.task_split_internal(str)]
+    return "\033[1m" + parsing.task_join_internal(tasks) + "\033[0m"
+
+
+def legacy_format_update(update):
+    if not re.match("[.!?]", update[-1]):
+        update += "."
+    return utils.upper_first(update)
+
+
+FORMATTERS = [(reporttree, "format_task", legacy_format_task), (reporttree, "format_update", legacy_format_update)]
+
+
+def weekly_spans(table):
+    '''
+    :return: the updates of each week of table, sorted by TaskId (as lite.report_this_week reports them)
+    '''
+    weeks = {}
+    for i, date in enumerate(table.Date):
+        if date:
+            weeks.setdefault(this_week_span(date)[0], []).append(i)
+    return [table.take(sorted(rows, key=table.TaskId.__getitem__)) for _, rows in sorted(weeks.items())]
+
+
+def render(table, spans):
+    '''
+    :return: (seconds spent writing the reports, text of the weekly reports of spans and of the last update of each
+    task)
+    '''
+    for module, name, _ in FORMATTERS:
+        cache_clear = getattr(getattr(module, name), "cache_clear", None)
+        if cache_clear:
+            cache_clear()
+    elapsed, txt = 0, []
+    for span in spans:
+        tree, updates = lite._report(table, span)
+        t0 = time.perf_counter()
+        txt.append(reporttree.write_reporttree(tree, updates, lite.BULLET, lite.BULLET2))
+        elapsed += time.perf_counter() - t0
+    last_updates = table.take(table.latest())
+    t0 = time.perf_counter()
+    txt.append(lite.report1(last_updates, groupby="Task", display_date=True, display_key=False, sortby="Order",
+                            ascending=True))
+    return elapsed + time.perf_counter() - t0, "".join(txt)
+
+
+def best_time(func, repeat):
+    '''
+    :param func: returns (seconds, result)
+    '''
+    return min((func() for _ in range(repeat)), key=lambda ret: ret[0])
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Render phase benchmark")
+    ap.add_argument("--lines", type=int, default=200000)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    table = lite.parse_tables(synthetic_log(args.lines))[0]
+    spans = weekly_spans(table)
+    print(f"{len(table)} updates, {len(set(table.TaskId))} tasks, {len(spans)} weekly reports")
+
+    elapsed, txt = best_time(lambda: render(table, spans), args.repeat)
+    memoized = [getattr(module, name) for module, name, _ in FORMATTERS]
+    for module, name, legacy in FORMATTERS:
+        setattr(module, name, legacy)
+    try:
+        legacy_elapsed, legacy_txt = best_time(lambda: render(table, spans), args.repeat)
+    finally:
+        for (module, name, _), func in zip(FORMATTERS, memoized):
+            setattr(module, name, func)
+    if txt != legacy_txt:
+        sys.exit("output differs from the former formatters")
+    print(f"memoized {elapsed * 1000:8.1f} ms  (former: {legacy_elapsed * 1000:8.1f} ms, "
+          f"x{legacy_elapsed / elapsed:.2f})  {len(txt):,} chars")
+    for func in memoized:
+        if hasattr(func, "cache_info"):
+            print(f"  {func.__module__}.{func.__name__}: {func.cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
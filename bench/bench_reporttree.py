@@ -0,0 +1,145 @@
+"""
+Report tree benchmark: building the report tree of a span and writing it (write_reporttree, both formats) on a
+synthetic task tree.
+
+    python bench/bench_reporttree.py [--updates N] [--depth D] [--repeat R]
+
+The tree has N updates on tasks up to D levels deep. Report trees are built on a task trie built once (as reports
+do on a Dataset), the former defaultdict tree was rebuilt per report. The memory of both is measured on the same
+updates: the trie with the rows of each task, the defaultdict tree with the updates of each task. The output is checked to be identical to the
+former recursive writer on the former tree, which are also timed (with their memory use), as is the first line
+of the streamed report.
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+import reporttree  # noqa: E402
+from reporttree import done, format_task, format_update, tab  # noqa: E402
+from tasktrie import TaskTrie  # noqa: E402
+
+
+def legacy_tree():
+    return defaultdict(legacy_tree)
+
+
+def legacy_task_tree(rows):
+    tasktree = legacy_tree()
+    updates = defaultdict(list)
+    for task, update, state in rows:
+        p = tasktree
+        for t in task.split("::"):
+            if t not in p:
+                p[t] = legacy_tree()
+            p = p[t]
+        p["_key"] = task
+        updates[task].append(update + done(state))
+    return tasktree, updates
+
+
+def legacy_depth_first_report(tree, updates, bullet1, bullet2, depth=0):
+    ret = ""
+    if "_key" in tree:
+        key = tree["_key"]
+        h = f"{tab(depth)}{bullet2}"
+        ret += h + ("\n" + h).join([format_update(x) for x in updates[key]]) + "\n"
+    for k, v in tree.items():
+        if k == "_key":
+            continue
+        ret += f"{tab(depth)}{bullet1}{format_task(k)}:\n" + legacy_depth_first_report(v, updates, bullet1, bullet2,
+                                                                                        depth + 1)
+    return ret
+
+
+def legacy_depth_first_report_flat(tree, updates, bullet):
+    ret = ""
+    if "_key" in tree and tree["_key"] in updates:
+        key = tree["_key"]
+        h = f"{bullet}{format_task(key)}: "
+        ret += h + ("\n" + h).join([format_update(x) for x in updates[key]]) + "\n"
+    for k, v in tree.items():
+        if k == "_key":
+            continue
+        ret += legacy_depth_first_report_flat(v, updates, bullet)
+    return ret
+
+
+def synthetic_rows(n_updates, depth, seed=0):
+    '''
+    :return: (task, update, done state) of n_updates updates on tasks of 1 to depth levels, sorted by task
+    '''
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(n_updates):
+        path = [f"task {rnd.randint(1, 4)}" for _ in range(rnd.randint(1, depth))]
+        rows.append(("::".join(path), f"update {i} of {path[-1]}", None))
+    return sorted(rows)
+
+
+def best_time(func, repeat):
+    best, ret = None, None
+    for _ in range(repeat):
+        ret = None
+        gc.collect()
+        t0 = time.perf_counter()
+        ret = func()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, ret
+
+
+def allocated(func):
+    '''
+    :return: (bytes allocated by func and still used by its result, result)
+    '''
+    gc.collect()
+    tracemalloc.start()
+    ret = func()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, ret
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Report tree writer benchmark")
+    ap.add_argument("--updates", type=int, default=100000)
+    ap.add_argument("--depth", type=int, default=20)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    rows = synthetic_rows(args.updates, args.depth)
+    task_ids = {}
+    for task, _, _ in rows:
+        task_ids.setdefault(task, len(task_ids))
+    id_rows = [(task_ids[task], update, state) for task, update, state in rows]
+    id_column = [task_id for task_id, _, _ in id_rows]
+    trie_size, trie = allocated(
+        lambda: TaskTrie(((task_id, task, None) for task, task_id in task_ids.items()), id_column))
+    legacy_size, (legacy, legacy_updates) = allocated(lambda: legacy_task_tree(rows))
+    print(f"task trie: {trie_size / 2**20:.1f} MB, {len(task_ids)} tasks  "
+          f"(defaultdict tree: {legacy_size / 2**20:.1f} MB, x{legacy_size / trie_size:.2f})")
+
+    elapsed, (tree, updates) = best_time(lambda: reporttree.span_tree(trie, id_rows), args.repeat)
+    legacy_elapsed, (legacy, legacy_updates) = best_time(lambda: legacy_task_tree(rows), args.repeat)
+    print(f"report tree      {elapsed * 1000:8.1f} ms  (defaultdict: {legacy_elapsed * 1000:8.1f} ms)  "
+          f"{args.updates} updates, depth {args.depth}")
+    for oldformat, write_legacy in (
+            (False, lambda: legacy_depth_first_report(legacy, legacy_updates, "* ", "o ")),
+            (True, lambda: legacy_depth_first_report_flat(legacy, legacy_updates, "* "))):
+        elapsed, txt = best_time(lambda: reporttree.write_reporttree(tree, updates, "* ", "o ", oldformat), args.repeat)
+        legacy_elapsed, legacy_txt = best_time(write_legacy, args.repeat)
+        if txt != legacy_txt:
+            sys.exit(f"oldformat={oldformat}: output differs from the recursive writer")
+        first, _ = best_time(lambda: next(reporttree.iter_reporttree(tree, updates, "* ", "o ", oldformat)), args.repeat)
+        print(f"oldformat={oldformat!s:5}  {elapsed * 1000:8.1f} ms  (recursive:   {legacy_elapsed * 1000:8.1f} ms)  "
+              f"{len(txt):,} chars, first line in {first * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Startup latency benchmark: wall time of `quick_update.py todo` on a small update file, checked against a budget.
+
+    python bench/bench_startup.py [--runs N] [--budget SECONDS] [SRC_DIR ...]
+
+Each SRC_DIR (default: src) is run from its parent directory, so an older checkout can be compared with the current
+one (see bench_parse). Exits with status 1 if the median time of a SRC_DIR is over the budget, and lists the heavy
+modules that the run imported.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_parse import SRC_DIR, synthetic_log
+
+HEAVY_MODULES = ["pandas", "numpy", "loguru", "dateutil", "concurrent.futures"]
+
+
+def run(src_dir, filename, *options):
+    return subprocess.run([sys.executable, *options, os.path.join(src_dir, "quick_update.py"), "-f", filename, "todo"],
+                          stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                          cwd=os.path.dirname(src_dir), text=True, check=True)
+
+
+def imported_modules(src_dir, filename):
+    stderr = run(src_dir, filename, "-X", "importtime").stderr
+    return {line.split("|")[-1].strip() for line in stderr.splitlines() if line.startswith("import time:")}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Startup latency benchmark")
+    ap.add_argument("src_dirs", nargs="*", default=[SRC_DIR])
+    ap.add_argument("--lines", type=int, default=500)
+    ap.add_argument("--runs", type=int, default=10)
+    ap.add_argument("--budget", type=float, default=0.15, help="maximum median time (seconds)")
+    args = ap.parse_args()
+
+    over_budget = False
+    with tempfile.NamedTemporaryFile("w", suffix=".txt") as file:
+        file.write(synthetic_log(args.lines))
+        file.flush()
+        for src_dir in args.src_dirs:
+            src_dir = os.path.abspath(src_dir)
+            times = []
+            for _ in range(args.runs):
+                t0 = time.perf_counter()
+                run(src_dir, file.name)
+                times.append(time.perf_counter() - t0)
+            median = statistics.median(times)
+            heavy = [module for module in HEAVY_MODULES if module in imported_modules(src_dir, file.name)]
+            status = "OK" if median <= args.budget else "OVER BUDGET"
+            print(f"{median * 1000:8.1f} ms median  (min {min(times) * 1000:.1f} ms, budget {args.budget * 1000:.0f} ms)"
+                  f"  {status}  heavy imports: {', '.join(heavy) or '-'}  {src_dir}")
+            over_budget = over_budget or median > args.budget
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == "__main__":
+    main()
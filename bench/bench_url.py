@@ -0,0 +1,108 @@
+"""
+URL tokenizer latency benchmark on adversarial update lines (near-miss URLs, unbalanced parentheses, many ":").
+
+    python bench/bench_url.py [--size N] [--budget-us US] [--legacy N]
+
+Exits with an error if a line takes longer than the budget (in microseconds per character) to parse, so regressions
+to a backtracking matcher are caught. --legacy N also times the former regex on the same corpus built with size N
+(keep N small, its time grows exponentially: size 8 already takes seconds).
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+import parsing  # noqa: E402
+
+LEGACY_REGEX_URL = r"\b((?:https?://|www\d{0,3}[.]|[a-z0-9.\-]+[.][a-z]{2,4}/)(?:[^\s()<>]+|\(([^\s()<>]+|(\([^\s()<>]+\)))*\))+(?:\(([^\s()<>]+|(\([^\s()<>]+\)))*\)|[^\s`!()\[\]{};:'\".,<>?«»“”‘’]))"
+
+
+def adversarial_updates(size):
+    '''
+    :return: [(name, update)], updates that make a backtracking URL regex explode, plus some ordinary long ones.
+    '''
+    return [
+        ("trailing punctuation", "see x:http://" + ".,;" * size),
+        ("dots after www", "see x:www." + "." * size * 3),
+        ("unclosed group", "see x:http://a" + "(b" * size),
+        ("unclosed nested group", "see x:http://a" + "(b(c)" * size + "("),
+        ("groups then bad end", "see x:http://a" + "(b)" * size + "!" * size),
+        ("many colons", "a:" * size * 5 + "b"),
+        ("near-miss domains", "x:" + "a.b.c/" * size + " " + "y:ab.cdefg/" * size),
+        ("many shorthands", " ".join(f"w{i}:https://example.com/p/{i}?q=(a)" for i in range(size))),
+        ("long url", "doc:https://docs.example.com/" + "path/(seg)/" * size + "end"),
+        ("long text", "worked on it, " * size),
+    ]
+
+
+def adversarial_lines(size):
+    '''
+    :return: [(name, line)] update and alias lines
+    '''
+    lines = []
+    for name, update in adversarial_updates(size):
+        lines.append((name, f"Task:: {update}"))
+        lines.append((f"alias, {name}", f"[A] Task:: {update.split(':', 1)[-1]} ORDER<a>"))
+    return lines
+
+
+def parse(line):
+    alias = parsing.parse_alias(line)
+    if alias:
+        return alias
+    task, update, done = parsing.parse_update_line(line)
+    return parsing.resolve_update(update)
+
+
+def legacy_parse(line, shorthand_rex, alias_rex):
+    if alias_rex.search(line):
+        return
+    task, update, done = parsing.parse_update_line(line)
+    return shorthand_rex.sub("[\\1](\\2)", update)
+
+
+def time_lines(lines, parse_line, repeat):
+    times = []
+    for name, line in lines:
+        best = None
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            parse_line(line)
+            elapsed = time.perf_counter() - t0
+            best = elapsed if best is None else min(best, elapsed)
+        times.append((best, name, len(line)))
+    return times
+
+
+def report(title, times):
+    print(title)
+    for elapsed, name, length in times:
+        print(f"  {elapsed * 1000:10.3f} ms  {length:7} chars  {elapsed * 1e6 / length:8.2f} us/char  {name}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="URL tokenizer latency benchmark")
+    ap.add_argument("--size", type=int, default=200)
+    ap.add_argument("--budget-us", type=float, default=10.0, help="maximum parse time per character of a line")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--legacy", type=int, metavar="N", help="also time the former regex, with corpus size N")
+    args = ap.parse_args()
+
+    times = time_lines(adversarial_lines(args.size), parse, args.repeat)
+    report(f"tokenizer (size {args.size}):", times)
+
+    if args.legacy:
+        shorthand_rex = re.compile(f"(?P<word>[^\\s]+):(?P<url>{LEGACY_REGEX_URL})")
+        alias_rex = re.compile(f"(?i)^\\[(?P<key>[^]]+)?\\][ \t]+(?P<task>.+)::[ \t]*(?P<url>{LEGACY_REGEX_URL})?")
+        legacy = time_lines(adversarial_lines(args.legacy), lambda line: legacy_parse(line, shorthand_rex, alias_rex), 1)
+        report(f"legacy regex (size {args.legacy}):", legacy)
+
+    slow = [name for elapsed, name, length in times if elapsed * 1e6 / length > args.budget_us]
+    if slow:
+        sys.exit(f"{len(slow)} lines over the {args.budget_us} us/char budget: {', '.join(slow)}")
+
+
+if __name__ == "__main__":
+    main()
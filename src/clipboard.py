@@ -0,0 +1,120 @@
+"""
+Clipboard backends. The reports of an invocation are collected with copy() and written at once by flush(), in a
+background thread, so printing never waits on the clipboard.
+"""
+import os
+import shutil
+import subprocess
+import sys
+import threading
+from functools import lru_cache
+
+from utils import myassert
+
+COMMANDS = {
+    "pbcopy": ["pbcopy"],
+    "xclip": ["xclip", "-selection", "clipboard"],
+    "wl-copy": ["wl-copy"],
+}
+BACKENDS = ["auto", *COMMANDS, "osc52", "file", "none"]
+DEFAULT_FILE = os.path.join("~", ".quick_update_clipboard.txt")
+
+_pending = []
+_backend = None  # (name, write function), see configure
+
+
+def write_command(command, txt):
+    subprocess.run(command, input=txt.encode("utf-8"), env=dict(os.environ, LANG="en_US.UTF-8"),
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def write_osc52(txt):
+    '''
+    Copies txt with the OSC 52 terminal escape sequence (the terminal sets its clipboard, also through ssh). It is
+    written to the terminal, never to a redirected stdout.
+    '''
+    import base64
+    seq = f"\033]52;c;{base64.b64encode(txt.encode('utf-8')).decode('ascii')}\a"
+    try:
+        with open("/dev/tty", "w") as tty:
+            tty.write(seq)
+    except OSError:
+        if sys.stderr.isatty():
+            sys.stderr.write(seq)
+            sys.stderr.flush()
+
+
+def write_file(path, txt):
+    with open(os.path.expanduser(path), "w") as file:
+        file.write(txt)
+
+
+def write_none(txt):
+    pass
+
+
+@lru_cache(maxsize=None)
+def detect():
+    '''
+    :return: name of the clipboard backend of this system: its clipboard command (pbcopy on MacOS, wl-copy on Wayland,
+    xclip on X11), osc52 in an ssh session, none otherwise. Detected once per process.
+    '''
+    if shutil.which("pbcopy"):
+        return "pbcopy"
+    if os.environ.get("WAYLAND_DISPLAY") and shutil.which("wl-copy"):
+        return "wl-copy"
+    if os.environ.get("DISPLAY") and shutil.which("xclip"):
+        return "xclip"
+    if os.environ.get("SSH_TTY"):
+        return "osc52"
+    return "none"
+
+
+def backend(name=None):
+    '''
+    :param name: one of BACKENDS (None: auto), file being "file" or "file:<path>" (default path DEFAULT_FILE)
+    :return: (name, write function of a text)
+    '''
+    if name is None or name == "auto":
+        name = detect()
+    name, _, path = name.partition(":")
+    myassert(name in BACKENDS and (not path or name == "file"),
+             f"UNKNOWN CLIPBOARD BACKEND [{name}]. BACKENDS: {', '.join(BACKENDS)} (or file:<path>)")
+    if name in COMMANDS:
+        myassert(shutil.which(COMMANDS[name][0]) is not None, f"CLIPBOARD COMMAND NOT FOUND: {COMMANDS[name][0]}")
+        return name, lambda txt: write_command(COMMANDS[name], txt)
+    if name == "file":
+        return name, lambda txt: write_file(path or DEFAULT_FILE, txt)
+    return name, write_osc52 if name == "osc52" else write_none
+
+
+def configure(name=None):
+    '''
+    Sets the backend used by flush (see backend), by default the detected one.
+    '''
+    global _backend
+    _backend = backend(name)
+
+
+def copy(txt):
+    '''
+    Adds txt to the text copied by the next flush.
+    '''
+    _pending.append(txt)
+
+
+def flush():
+    '''
+    Writes all the texts copied since the last flush to the clipboard, in one write, in a background thread (the
+    interpreter waits for it before exiting).
+    :return: the thread, None if there was nothing to copy
+    '''
+    if not _pending:
+        return None
+    if _backend is None:
+        configure()
+    txt = "".join(_pending)
+    _pending.clear()
+    thread = threading.Thread(target=_backend[1], args=(txt,), name="clipboard")
+    thread.start()
+    return thread
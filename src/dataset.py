@@ -0,0 +1,243 @@
+"""
+A parsed updates DataFrame together with the per-task indexes the reports need, built once and shared by them.
+"""
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from parsing import DONE_STATES, EPOCH_ORDINAL
+from tasktrie import TaskTrie
+
+NO_DAY = np.iinfo("int64").min  # day ordinal of undated updates
+
+
+def day_ordinals(df):
+    '''
+    :return: int64 array of days since 1970-01-01 of each update (NO_DAY if undated)
+    '''
+    return df.Date.to_numpy().astype("datetime64[D]").view("int64")
+
+
+def day_ordinal(date):
+    return date.toordinal() - EPOCH_ORDINAL
+
+
+def latest_state_index(df):
+    '''
+    :return: DataFrame indexed by TaskId with, for each task in df: Row (position in df of its last update by date, ties
+    going to the last one in file order), Date and Done (date and state of that update), FirstDate and Updates (number
+    of updates). Sorted by most recent Date first, ties in file order.
+    '''
+    dates = df.Date.to_numpy()
+    task_ids = df.TaskId.to_numpy()
+    by_date = np.argsort(dates, kind="stable")
+    sorted_ids = task_ids[by_date]
+    ids, first = np.unique(sorted_ids, return_index=True)
+    _, last_reversed = np.unique(sorted_ids[::-1], return_index=True)
+    last = by_date[len(by_date) - 1 - last_reversed]
+    index = pd.DataFrame({
+        "Row": last,
+        "Date": dates[last],
+        "Done": df.Done.iloc[last].array,
+        "FirstDate": dates[by_date[first]],
+        "Updates": np.bincount(task_ids)[ids],
+    }, index=pd.Index(ids, name="TaskId"))
+    return index.sort_values(["Date", "Row"], ascending=[False, True])
+
+
+class Dataset:
+    '''
+    Updates DataFrame (as returned by the parser or a filter of it) with its per-task indexes, built on first use.
+    '''
+
+    def __init__(self, df):
+        self.df = df
+        self._latest = {}
+        self._days = None
+        self._cover, self._cover_by_task = None, None
+        self._pending = None
+        self._trie = None
+
+    def __len__(self):
+        return len(self.df)
+
+    def take(self, rows):
+        '''
+        :return: Dataset of the given row positions
+        '''
+        return Dataset(self.df.iloc[rows])
+
+    def task_trie(self):
+        '''
+        :return: TaskTrie of the tasks of self.df
+        '''
+        if self._trie is None:
+            task_ids, first = np.unique(self.df.TaskId.to_numpy(), return_index=True)
+            tasks = self.df.Task.cat.categories[task_ids]
+            keys = [key if isinstance(key, str) else None for key in self.df.Key.iloc[first]]
+            self._trie = TaskTrie(zip(task_ids.tolist(), tasks, keys), self.df.TaskId.to_numpy().tolist())
+        return self._trie
+
+    def filter_task(self, task, aliases=None):
+        '''
+        :return: Dataset of the updates of task and its subtasks (see TaskTrie.task_ids)
+        '''
+        return self.take(self.task_trie().rows(task, aliases))
+
+    def filter_substring(self, substring):
+        return Dataset(self.df[self.df.Update.str.contains(substring, regex=False)])
+
+    def sorted_days(self):
+        '''
+        :return: (days, order, descending), day ordinals sorted ascending and the df positions they come from. Update
+        files are sorted by date, so order is only needed (not None) for unsorted data; descending means days is self.df
+        reversed.
+        '''
+        if self._days is None:
+            days = day_ordinals(self.df)
+            if np.all(days[1:] >= days[:-1]):
+                self._days = days, None, False
+            elif np.all(days[1:] <= days[:-1]):
+                self._days = days[::-1], None, True
+            else:
+                order = np.argsort(days, kind="stable")
+                self._days = days[order], order, False
+        return self._days
+
+    def span_rows(self, startdate=None, enddate=None):
+        '''
+        :return: positions in self.df of the dated updates from startdate to enddate (both included, None for no limit),
+        found by binary search: a slice for sorted data, else an array in file order
+        '''
+        days, order, descending = self.sorted_days()
+        first = np.searchsorted(days, day_ordinal(startdate) if startdate else NO_DAY + 1, "left")
+        end = np.searchsorted(days, day_ordinal(enddate), "right") if enddate else len(days)
+        if order is not None:
+            return np.sort(order[first:end])
+        if descending:
+            return slice(len(days) - end, len(days) - first)
+        return slice(first, end)
+
+    def span(self, startdate=None, enddate=None):
+        '''
+        :return: the updates from startdate to enddate in file order (see span_rows)
+        '''
+        return self.df.iloc[self.span_rows(startdate, enddate)]
+
+    def cover(self, startdate=None, enddate=None):
+        '''
+        Sets the span whose updates by_task sorts once, for all the spans inside it.
+        '''
+        self._cover = self.span_rows(startdate, enddate)
+        self._cover_by_task = None
+
+    def by_task(self, startdate=None, enddate=None):
+        '''
+        :return: the updates from startdate to enddate sorted by TaskId, ties in file order
+        '''
+        rows = self.span_rows(startdate, enddate)
+        cover = self._cover
+        if isinstance(rows, slice) and isinstance(cover, slice) and cover.start <= rows.start and rows.stop <= cover.stop:
+            if self._cover_by_task is None:
+                self._cover_by_task = self.task_sorted(np.arange(cover.start, cover.stop))
+            positions = self._cover_by_task
+            positions = positions[(positions >= rows.start) & (positions < rows.stop)]
+        else:
+            positions = self.task_sorted(np.arange(len(self.df))[rows])
+        return self.df.iloc[positions]
+
+    def weeks(self, startdate, enddate):
+        '''
+        :return: [(monday, updates of the week sorted by TaskId)] for each week (Monday to Sunday) from the one of
+        startdate to the one of enddate, bucketed in one pass over the task sorted span
+        '''
+        first = startdate - timedelta(days=startdate.weekday())
+        last = enddate + timedelta(days=6 - enddate.weekday())
+        nweeks = (day_ordinal(last) - day_ordinal(first)) // 7 + 1
+        if nweeks <= 0:
+            return []
+        df = self.by_task(first, last)
+        weeks = (day_ordinals(df) - day_ordinal(first)) // 7
+        order = np.argsort(weeks, kind="stable")
+        bounds = np.searchsorted(weeks[order], np.arange(nweeks + 1))
+        return [(first + timedelta(weeks=week), df.iloc[order[bounds[week]:bounds[week + 1]]]) for week in range(nweeks)]
+
+    def task_sorted(self, positions):
+        return positions[np.argsort(self.df.TaskId.to_numpy()[positions], kind="stable")]
+
+    def pending(self):
+        '''
+        :return: Dataset of the updates marked pending "(!)"
+        '''
+        if self._pending is None:
+            self._pending = self.filter_substring("(!)")
+        return self._pending
+
+    def latest(self, today=None):
+        '''
+        :return: latest_state_index of the updates dated up to today (all of them if None), Row positions refer to
+        self.df
+        '''
+        if today not in self._latest:
+            if today:
+                rows = np.flatnonzero((self.df.Date <= today).to_numpy())
+                index = latest_state_index(self.df.iloc[rows])
+                index["Row"] = rows[index.Row.to_numpy(dtype="int64")]
+            else:
+                index = latest_state_index(self.df)
+            self._latest[today] = index
+        return self._latest[today]
+
+    def at_state(self, state, today=None, most_recent=False):
+        '''
+        :param state: one of DONE_STATES, None for open tasks
+        :return: latest state index of the tasks whose last update is at state, most recent first
+        '''
+        index = self.latest(today)
+        index = index[index.Done.isnull()] if state is None else index[index.Done == state]
+        if most_recent:
+            index = index.head(most_recent)
+        return index
+
+    def completion_tasks(self, state, today=None, most_recent=False):
+        '''
+        :return: last update of each task at state, most recent first
+        '''
+        return self.df.iloc[self.at_state(state, today, most_recent).Row.to_numpy(dtype="int64")]
+
+    def task_stats(self, now):
+        '''
+        :return: DataFrame indexed by TaskId with, for each task updated up to now: Task, FirstDate, LastDate, Done (state
+        of the last update), CloseDate (LastDate of closed tasks), CycleDays (FirstDate to CloseDate), StandbyDays (days
+        from each standby update to the next update of the task, or to now) and Updates
+        '''
+        index = self.latest(now)
+        days = day_ordinals(self.df)
+        rows = np.flatnonzero(days <= day_ordinal(now))
+        rows = rows[np.lexsort((days[rows], self.df.TaskId.to_numpy()[rows]))]
+        task_ids = self.df.TaskId.to_numpy()[rows]
+        days = days[rows]
+        next_days = np.append(days[1:], day_ordinal(now))
+        last_of_task = np.append(task_ids[1:] != task_ids[:-1], True)
+        next_days[last_of_task] = day_ordinal(now)
+        standby = self.df.Done.cat.codes.to_numpy()[rows] == DONE_STATES.index("STANDBY")
+        standby_days = np.bincount(task_ids, weights=np.where(standby, next_days - days, 0),
+                                   minlength=len(self.df.Task.cat.categories))
+
+        stats = pd.DataFrame({
+            "Task": self.df.Task.iloc[index.Row.to_numpy(dtype="int64")].astype(str).to_numpy(),
+            "FirstDate": index.FirstDate,
+            "LastDate": index.Date,
+            "Done": index.Done,
+        }, index=index.index)
+        closed = (stats.Done == "DONE").to_numpy()
+        stats["CloseDate"] = stats.LastDate.where(closed)
+        stats["CycleDays"] = (stats.CloseDate - stats.FirstDate).dt.days
+        stats["StandbyDays"] = standby_days[index.index.to_numpy(dtype="int64")]
+        stats["Updates"] = index.Updates
+        return stats.sort_index()
+
+
+def as_dataset(data):
+    return data if isinstance(data, Dataset) else Dataset(data)
@@ -0,0 +1,297 @@
+"""
+Lightweight engine: the parse tables and reports of parsing/reports/dataset on plain Python lists, without importing
+numpy or pandas (which takes longer than parsing and reporting a small update file).
+Missing values are None (NaN in the pandas engine). Reports are the same as those of the pandas engine.
+"""
+import calendar
+from datetime import datetime
+
+import loader
+import reporttree
+from parsing import DONE_STATES, collect_events, parse_stream
+from reportlines import BULLET, BULLET2, format_line
+from tasktrie import TaskTrie
+from utils import last_day, last_week_span, this_week_span, week_datestr
+
+COLUMNS = ["Date", "Task", "Update", "Done", "Key", "Order", "URL", "TaskId"]
+
+
+class Table:
+    '''
+    Update columns (same as the pandas engine DataFrame) as lists, e.g. table.Task[i] is the task of update i. It
+    also serves as the Dataset of the lite reports.
+    '''
+
+    def __init__(self, columns):
+        self.columns = columns
+        self._pending = None
+        self._trie = None
+
+    def __getattr__(self, name):
+        if name in COLUMNS:
+            return self.columns[name]
+        raise AttributeError(name)
+
+    def __len__(self):
+        return len(self.columns["TaskId"])
+
+    def take(self, rows):
+        '''
+        :return: Table of the given row positions
+        '''
+        return Table({name: [column[i] for i in rows] for name, column in self.columns.items()})
+
+    def task_trie(self):
+        if self._trie is None:
+            first = {}
+            for i, task_id in enumerate(self.TaskId):
+                first.setdefault(task_id, i)
+            tasks = ((task_id, self.Task[i], self.Key[i]) for task_id, i in sorted(first.items()))
+            self._trie = TaskTrie(tasks, self.TaskId)
+        return self._trie
+
+    def filter_task(self, task, aliases=None):
+        return self.take(self.task_trie().rows(task, aliases))
+
+    def filter_substring(self, substring):
+        return self.take([i for i, update in enumerate(self.Update) if substring in update])
+
+    def pending(self):
+        '''
+        :return: Table of the updates marked pending "(!)"
+        '''
+        if self._pending is None:
+            self._pending = self.filter_substring("(!)")
+        return self._pending
+
+    def cover(self, startdate=None, enddate=None):
+        '''
+        (Dataset interface: spans are filtered on each use here)
+        '''
+
+    def span_rows(self, startdate=None, enddate=None):
+        '''
+        :return: positions of the dated updates from startdate to enddate (days, both included, None for no limit)
+        '''
+        first = startdate.toordinal() if startdate else 1
+        last = enddate.toordinal() if enddate else datetime.max.toordinal()
+        return [i for i, date in enumerate(self.Date) if date and first <= date.toordinal() <= last]
+
+    def span(self, startdate=None, enddate=None):
+        '''
+        :return: Table of the dated updates from startdate to enddate, in table order
+        '''
+        return self.take(self.span_rows(startdate, enddate))
+
+    def by_task(self, startdate=None, enddate=None):
+        '''
+        :return: the updates from startdate to enddate sorted by TaskId, ties in file order
+        '''
+        return self.take(sorted(self.span_rows(startdate, enddate), key=self.TaskId.__getitem__))
+
+    def latest(self, today=None):
+        '''
+        :return: position of the last update (by date, ties going to the last one in file order) of each task with
+        updates dated up to today (all of them if None), most recent first, ties in file order
+        '''
+        last = {}
+        dates = self.Date
+        for i, (date, task_id) in enumerate(zip(dates, self.TaskId)):
+            if date is None or (today and date > today):
+                continue
+            j = last.get(task_id)
+            if j is None or date >= dates[j]:
+                last[task_id] = i
+        return sorted(last.values(), key=lambda i: (-dates[i].toordinal(), i))
+
+    def at_state(self, state, today=None, most_recent=False):
+        '''
+        :param state: one of DONE_STATES, None for open tasks
+        :return: positions of the last update of the tasks whose last update is at state, most recent first
+        '''
+        rows = [i for i in self.latest(today) if self.Done[i] == state]
+        return rows[:most_recent] if most_recent else rows
+
+    def completion_tasks(self, state, today=None, most_recent=False):
+        return self.take(self.at_state(state, today, most_recent))
+
+
+# ------------------------------------------------------------------------------------------------------------
+# PARSING:
+# ------------------------------------------------------------------------------------------------------------
+
+def tables_from_events(events, row_filter=None, warn_aliases=False):
+    '''
+    Collects parse events into the update Table (see parsing.collect_events).
+    :return: (table, todos, postfixes, date_ascending, aliases, urls, order, tasks), tasks being the (Task, Key, Order,
+    URL) of each TaskId
+    '''
+    columns, todos, postfixes, date_ascending, aliases, urls, order, task_rows = collect_events(events, row_filter,
+                                                                                               warn_aliases)
+    task_ids = columns["TaskId"]
+    dates = {day: datetime.fromordinal(day) for day in set(columns["Day"]) if day}
+    updates = [update + task_rows[task_id][5] for update, task_id in zip(columns["Update"], task_ids)]
+    states = [task_rows[task_id][4] if task_rows[task_id][4] >= 0 else state
+              for state, task_id in zip(columns["State"], task_ids)]
+    table = Table({
+        "Date": [dates.get(day) for day in columns["Day"]],
+        "Task": [task_rows[task_id][0] for task_id in task_ids],
+        "Update": updates,
+        "Done": [DONE_STATES[state] if state >= 0 else None for state in states],
+        "Key": [task_rows[task_id][1] for task_id in task_ids],
+        "Order": [task_rows[task_id][2] for task_id in task_ids],
+        "URL": [task_rows[task_id][3] for task_id in task_ids],
+        "TaskId": task_ids,
+    })
+    tasks = [row[:4] for row in task_rows]
+    return table, todos, postfixes, date_ascending, aliases, urls, order, tasks
+
+
+def parse_tables(string, row_filter=None, warn_aliases=False):
+    '''
+    :return: see tables_from_events
+    '''
+    return tables_from_events(parse_stream(string.split("\n"), None, row_filter), row_filter, warn_aliases)
+
+
+def parse_file(string, row_filter=None):
+    table, todos, postfixes, date_ascending, aliases, urls, order, tasks = parse_tables(string, row_filter, True)
+    return table, todos, postfixes, date_ascending, aliases
+
+
+def load(filenames, jobs=None, row_filter=None):
+    '''
+    See loader.load (without cache).
+    '''
+    return tables_from_events(loader.iter_events(filenames, None, jobs, row_filter), row_filter, warn_aliases=True)
+
+
+def load_window(filenames, startdate, enddate):
+    '''
+    See loader.load_window.
+    '''
+    return tables_from_events(loader.iter_window_events(filenames, startdate, enddate))
+
+
+# ------------------------------------------------------------------------------------------------------------
+# REPORTS:
+# ------------------------------------------------------------------------------------------------------------
+
+def report1(
+        table,
+        groupby,
+        display_key=True,
+        display_done=False,
+        display_date=False,
+        last_only=None,
+        sortby="Date",
+        ascending=False,
+        display_group_headers=True
+):
+    rows = range(len(table))
+    if last_only:
+        last = {}
+        for i in sorted(rows, key=table.Date.__getitem__):
+            key = getattr(table, last_only)[i]
+            if key is not None:
+                last[key] = i
+        rows = sorted(last.values(), key=lambda i: (table.Date[i], i))
+    rows = sorted(rows, key=getattr(table, sortby).__getitem__, reverse=not ascending)
+
+    # groups in order of first appearance, rows with no group are dropped:
+    groups = {}
+    names = getattr(table, groupby)
+    for i in rows:
+        if names[i] is not None:
+            groups.setdefault(names[i], []).append(i)
+    ret = ""
+    for name, group in groups.items():
+        if display_group_headers and len(group) > 1:
+            ret += BULLET + str(name) + "\n"
+        for i in group:
+            ret += format_line(table.Key[i], table.Task[i], table.Update[i], done=table.Done[i],
+                               date=table.Date[i] if display_date else None, level=1, display_key=display_key,
+                               display_done=display_done, url=table.URL[i])
+    return ret
+
+
+def completion_tasks(table, completion_value, today=None, most_recent=False):
+    '''
+    :return: last update of each task whose state is completion_value (None: open), most recent first
+    '''
+    return table.completion_tasks(completion_value, today, most_recent)
+
+
+def report_completion_tasks(table, completion_value=None, today=None):
+    return report1(completion_tasks(table, completion_value, today), groupby="Task", display_date=True,
+                   display_key=False, last_only=None, sortby="Order", ascending=True)
+
+
+def report_tasks_at_state(table, postfixes, state, today, most_recent=False):
+    ret = ""
+    for i in sorted(table.at_state(state, today, most_recent), key=table.TaskId.__getitem__):
+        k = f"[{table.Key[i]}]" if table.Key[i] is not None else ""
+        ret += f"{k:10s}\t{table.Task[i]}\n"
+    return ret
+
+
+def report_tasks(table, postfixes, today, most_recent=False):
+    if most_recent:
+        return report_tasks_at_state(table, postfixes, None, today, most_recent)
+    ret = ""
+    states = {"PENDING": "PENDING", "OPEN": None, "STANDBY": "STANDBY", "CLOSED": "DONE"}
+    for state in states:
+        ret += "\n  * " + state + ":\n" + report_tasks_at_state(table, postfixes, states[state], today)
+    return ret
+
+
+def report_span(table, startdate, enddate):
+    if startdate is None and enddate is None:
+        title = "SPAN: All"
+    elif startdate is None:
+        title = f"SPAN: <= {enddate:%Y-%m-%d}\n\n"
+    elif enddate is None:
+        title = f"SPAN: >= {startdate:%Y-%m-%d}\n\n"
+    else:
+        title = f"SPAN: {startdate:%Y-%m-%d} - {enddate:%Y-%m-%d}\n\n"
+    tree, updates = _report(table, table.by_task(startdate, enddate))
+    return title, tree, updates
+
+
+def _report(table, span):
+    '''
+    :param span: updates of table sorted by TaskId (which is Order, Task, URL order)
+    '''
+    return reporttree.span_tree(table.task_trie(), zip(span.TaskId, span.Update, span.Done))
+
+
+def write_report_span(table, startdate, enddate, stream=False):
+    title, tree, updates = report_span(table, startdate, enddate)
+    lines = reporttree.iter_reporttree(tree, updates, BULLET, BULLET2)
+    return title, lines if stream else "".join(lines)
+
+
+def report_this_week(table, date, stream=False):
+    startdate, enddate = this_week_span(date)
+    title = f"This Week #{startdate.isocalendar()[1]}: {week_datestr(startdate, enddate)}"
+    return title, write_report_span(table, startdate, enddate, stream)[1]
+
+
+def report_last_week(table, date, weeks=1, stream=False):
+    startdate, enddate = last_week_span(date, weeks)
+    datestr = week_datestr(startdate, enddate)
+    if weeks == 1:
+        title = f"Last Week #{startdate.isocalendar()[1]}: {datestr}"
+    else:
+        title = f"Last {weeks} Weeks: {datestr}"
+    return title, write_report_span(table, startdate, enddate, stream)[1]
+
+
+def report_today(table, date, stream=False):
+    return f"Today {date.date().isoformat()}:", write_report_span(table, date, date, stream)[1]
+
+
+def report_last_day(table, date, stream=False):
+    startdate = last_day(date)
+    title = f"{calendar.day_name[startdate.weekday()]} {startdate.date().isoformat()}:"
+    return title, write_report_span(table, startdate, startdate, stream)[1]
@@ -0,0 +1,394 @@
+"""
+Loading of update files: reading, parsing and (optionally) caching the parse results on disk.
+"""
+import hashlib
+import io
+import mmap
+import os
+import pickle
+import sys
+
+from parsing import ROW_EVENT, DateOrder, block_hash, iter_blocks, parse_block, parse_date, tables_from_events, \
+    warn_unused_aliases
+from search import InvertedIndex
+
+SNAPSHOT_VERSION = 3
+EDGE_BYTES = 64 << 10  # hashed at both ends of a file whose size and mtime did not change
+PARALLEL_MIN_BYTES = 2 << 20  # below this, starting worker processes costs more than it saves
+SCAN_CHUNK_BYTES = 16 << 20
+
+
+# ------------------------------------------------------------------------------------------------------------
+# FINGERPRINTS:
+# ------------------------------------------------------------------------------------------------------------
+
+def content_hash(filename):
+    h = hashlib.sha1()
+    with open(filename, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def edge_hash(filename, size):
+    '''
+    :return: hash of the first and last EDGE_BYTES of the file (of all of it if it is smaller)
+    '''
+    h = hashlib.sha1()
+    with open(filename, "rb") as file:
+        h.update(file.read(EDGE_BYTES))
+        if size > EDGE_BYTES:
+            file.seek(max(EDGE_BYTES, size - EDGE_BYTES))
+            h.update(file.read())
+    return h.hexdigest()
+
+
+def file_fingerprint(filename):
+    '''
+    :return: (path, size, mtime_ns, content hash, edge hash)
+    '''
+    st = os.stat(filename)
+    path = os.path.abspath(filename)
+    return path, st.st_size, st.st_mtime_ns, content_hash(filename), edge_hash(filename, st.st_size)
+
+
+def fingerprint_matches(fingerprint, filename):
+    '''
+    Size and mtime are checked first. When they did not change, only both ends of the file are hashed (see edge_hash):
+    an edit keeping the size and the mtime (to the nanosecond) is only seen if it is within EDGE_BYTES of the start
+    or of the end. Otherwise the whole content is hashed (e.g. the file was touched or checked out again without
+    modification).
+    '''
+    path, size, mtime_ns, digest, edge_digest = fingerprint
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return False
+    if path != os.path.abspath(filename) or size != st.st_size:
+        return False
+    if mtime_ns == st.st_mtime_ns:
+        return edge_digest == edge_hash(filename, size)
+    return digest == content_hash(filename)
+
+
+# ------------------------------------------------------------------------------------------------------------
+# SNAPSHOTS:
+# ------------------------------------------------------------------------------------------------------------
+
+def cache_path(cache_dir, filenames, kind):
+    key = hashlib.sha1("\n".join(os.path.abspath(f) for f in filenames).encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, f"{kind}-{key[:16]}.pkl")
+
+
+def read_pickle(path):
+    try:
+        with open(path, "rb") as file:
+            return pickle.load(file)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        return None
+
+
+def write_pickle(path, obj):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as file:
+        pickle.dump(obj, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+
+def read_snapshot(cache_dir, filenames):
+    '''
+    :return: the cached parse tables, or None if there is no valid snapshot for these files.
+    '''
+    snapshot = read_pickle(cache_path(cache_dir, filenames, "snapshot"))
+    if not snapshot or snapshot.get("version") != SNAPSHOT_VERSION:
+        return None
+    fingerprints = snapshot["fingerprints"]
+    if len(fingerprints) != len(filenames):
+        return None
+    for fingerprint, filename in zip(fingerprints, filenames):
+        if not fingerprint_matches(fingerprint, filename):
+            return None
+    return snapshot["tables"]
+
+
+def write_snapshot(cache_dir, filenames, fingerprints, tables):
+    snapshot = {"version": SNAPSHOT_VERSION, "fingerprints": fingerprints, "tables": tables}
+    write_pickle(cache_path(cache_dir, filenames, "snapshot"), snapshot)
+
+
+def read_block_cache(cache_dir, filenames):
+    blocks = read_pickle(cache_path(cache_dir, filenames, "blocks"))
+    if not blocks or blocks.get("version") != SNAPSHOT_VERSION:
+        return {}
+    return blocks["blocks"]
+
+
+def write_block_cache(cache_dir, filenames, block_cache):
+    write_pickle(cache_path(cache_dir, filenames, "blocks"), {"version": SNAPSHOT_VERSION, "blocks": block_cache})
+
+
+def load_search_index(cache_dir, filenames, df, filtered=False):
+    '''
+    :param df: updates table loaded from filenames
+    :param filtered: whether df is a filtered (RowFilter or window) load of filenames: its rows can change between
+    runs, so its index is not cached (only the cached tokens of the texts are reused)
+    :return: search.InvertedIndex of df. If cache_dir is given it is stored there, and reused while the files do not
+    change. When they do change, the texts tokenized for the previous index are reused.
+    '''
+    if not cache_dir:
+        return InvertedIndex(df.Update, df.Task)
+    path = cache_path(cache_dir, filenames, "index")
+    cached = read_pickle(path)
+    if not cached or cached.get("version") != SNAPSHOT_VERSION:
+        cached = None
+    elif not filtered and len(cached["fingerprints"]) == len(filenames) and cached["index"].n_rows == len(df) and all(
+            fingerprint_matches(fingerprint, filename)
+            for fingerprint, filename in zip(cached["fingerprints"], filenames)):
+        return cached["index"]
+
+    index = InvertedIndex(df.Update, df.Task, cached["index"].text_tokens if cached else None)
+    if not filtered:
+        fingerprints = [file_fingerprint(f) for f in filenames]
+        write_pickle(path, {"version": SNAPSHOT_VERSION, "fingerprints": fingerprints, "index": index})
+    return index
+
+
+# ------------------------------------------------------------------------------------------------------------
+# LOADING:
+# ------------------------------------------------------------------------------------------------------------
+
+# Worker state, see init_worker
+_hash_blocks = False
+_known_blocks = frozenset()
+_row_filter = None
+
+
+def init_worker(hash_blocks, known_blocks, row_filter=None):
+    '''
+    :param hash_blocks: whether blocks are hashed (for the block cache)
+    :param known_blocks: hashes of the blocks already in the block cache (they are not parsed again)
+    :param row_filter: optional parsing.RowFilter
+    '''
+    global _hash_blocks, _known_blocks, _row_filter
+    _hash_blocks, _known_blocks, _row_filter = hash_blocks, known_blocks, row_filter
+
+
+def parse_path(filename):
+    '''
+    Reads and parses one file (in a worker process when loading in parallel).
+    :return: (date_lines, blocks) where blocks is a list of (block hash, parse events), events being None for the
+    blocks in _known_blocks.
+    '''
+    date_lines = []
+    blocks = []
+    try:
+        with open(filename, "r") as _file:
+            for block in iter_blocks(_file, date_lines):
+                key = block_hash(*block) if _hash_blocks else None
+                blocks.append((key, None if key in _known_blocks else parse_block(*block, _row_filter)))
+    except SystemExit as e:
+        sys.exit(f"{e.code}\nFILE: {filename}")
+    return date_lines, blocks
+
+
+def default_jobs(filenames):
+    if len(filenames) < 2 or sum(os.path.getsize(f) for f in filenames) < PARALLEL_MIN_BYTES:
+        return 1
+    return os.cpu_count() or 1
+
+
+def iter_events(filenames, block_cache=None, jobs=None, row_filter=None):
+    '''
+    Parses the files (in parallel worker processes if jobs > 1) and yields their parse events in file order.
+    The date order is checked across files.
+    :param block_cache: see parsing.parse_stream
+    :param jobs: number of worker processes, by default one per core for large inputs
+    :param row_filter: see parsing.parse_stream
+    '''
+    jobs = jobs or default_jobs(filenames)
+    if row_filter is not None:
+        block_cache = None
+    hash_blocks = block_cache is not None
+    known_blocks = frozenset(block_cache) if hash_blocks else frozenset()
+
+    executor = None
+    if jobs > 1:
+        import concurrent.futures  # (not imported by single process runs, to start faster)
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=min(jobs, len(filenames)), initializer=init_worker,
+            initargs=(hash_blocks, known_blocks, row_filter))
+        results = executor.map(parse_path, filenames)
+    else:
+        init_worker(hash_blocks, known_blocks, row_filter)
+        results = map(parse_path, filenames)
+
+    try:
+        date_order = DateOrder()
+        used_blocks = {}
+        for filename, (date_lines, blocks) in zip(filenames, results):
+            for linenum, date, line in date_lines:
+                date_order.check(date, f"{filename}:{linenum}", line)
+            for key, events in blocks:
+                if events is None:
+                    events = block_cache[key]
+                if hash_blocks:
+                    used_blocks[key] = events
+                yield from events
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+
+    if hash_blocks:
+        block_cache.clear()
+        block_cache.update(used_blocks)
+
+
+# ------------------------------------------------------------------------------------------------------------
+# WINDOWED READS:
+# ------------------------------------------------------------------------------------------------------------
+
+def head_state(mm, offset):
+    '''
+    :return: (number of lines, whether a ### comment block is open) before offset (a line start) of the mapped file.
+    Only counts bytes, nothing is lexed.
+    '''
+    linenum, comment_blocks = 0, 0
+    start = 0
+    while start < offset:
+        end = min(start + SCAN_CHUNK_BYTES, offset)
+        if end < offset:
+            end = mm.find(b"\n", end - 1, offset) + 1 or offset
+        chunk = mm[start:end]
+        linenum += chunk.count(b"\n")
+        pos = chunk.find(b"###")
+        while pos >= 0:
+            if not chunk[chunk.rfind(b"\n", 0, pos) + 1:pos].strip():
+                comment_blocks += 1
+            pos = chunk.find(b"\n", pos)
+            pos = chunk.find(b"###", pos) if pos >= 0 else -1
+        start = end
+    return linenum, comment_blocks % 2 == 1
+
+
+def tail_offset(mm, startdate):
+    '''
+    Scans the lines of an ascending file backwards from the end.
+    :return: (offset, date) where offset is the start of the first date line from startdate on (of the last date line
+    if all are older) and date is the date before it (None if there is none)
+    '''
+    offset = None
+    end = len(mm)
+    while end > 0:
+        pos = mm.rfind(b"\n", 0, end)
+        line = mm[pos + 1:end].strip()
+        end = pos
+        if line[:1] != b"#" or not line[1:].lstrip()[:1].isdigit():
+            continue
+        date = parse_date(line.decode("utf-8", "replace"))
+        if date is None:
+            continue
+        if date < startdate:
+            return pos + 1 if offset is None else offset, date
+        offset = pos + 1
+    return offset or 0, None
+
+
+def tail_blocks(filename, startdate):
+    '''
+    :return: the date blocks of an ascending file from startdate on (the last block if all are older), reached from the
+    end of the file. Lines before the first of these blocks (after a ### comment block) are returned with the date of
+    the previous date line.
+    '''
+    with open(filename, "rb") as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            offset, date = tail_offset(mm, startdate)
+            linenum, doclines_on = head_state(mm, offset)
+        file.seek(offset)
+        lines = io.TextIOWrapper(file)
+        blocks = list(iter_blocks(lines, linenum=linenum, doclines_on=doclines_on))
+    blocks[0] = (date, blocks[0][1])
+    return blocks
+
+
+def window_blocks(filename, startdate):
+    '''
+    Lexes the alias header of filename (the lines before the first date) and the date blocks from startdate on, without
+    reading the older blocks: for descending files the recent blocks are read from the top, for ascending files they
+    are reached by scanning the end of the file backwards.
+    :return: list of (date, lines) blocks (see parsing.iter_blocks), some may be older than startdate.
+    '''
+    with open(filename, "r") as file:
+        blocks = iter_blocks(file)
+        window = [next(blocks)]
+        first, second = next(blocks, None), next(blocks, None)
+        if second is None or first[0] > second[0]:
+            window += [block for block in (first, second) if block]
+            if second and second[0] >= startdate:
+                for block in blocks:
+                    window.append(block)
+                    if block[0] < startdate:
+                        break
+            return window
+    return window + tail_blocks(filename, startdate)
+
+
+def iter_window_events(filenames, startdate, enddate):
+    '''
+    Parses the blocks of the files dated between startdate and enddate (and the alias definitions of the other blocks
+    that are read).
+    '''
+    for filename in filenames:
+        try:
+            for date, lines in window_blocks(filename, startdate):
+                if date is not None and not startdate <= date <= enddate:
+                    lines = [(linenum, line) for linenum, line in lines if line.startswith("[")]
+                for event in parse_block(date, lines):
+                    if event[0] != ROW_EVENT or startdate <= event[1] <= enddate:
+                        yield event
+        except SystemExit as e:
+            sys.exit(f"{e.code}\nFILE: {filename}")
+
+
+def load_window(filenames, startdate, enddate):
+    '''
+    Like load, but only reads the alias headers and the date blocks between startdate and enddate (dates), so the time
+    taken by short reports does not grow with the history. Updates, TODOs and pending marks outside the window are
+    ignored (so the states of the updates in the window can differ from those of load), and aliases must be defined
+    in the header or in the window. Dates are only checked within the window.
+    :return: (df, todos, postfixes, date_ascending, aliases, urls, order, tasks)
+    '''
+    return tables_from_events(iter_window_events(filenames, startdate, enddate))
+
+
+def load(filenames, cache_dir=None, jobs=None, row_filter=None):
+    '''
+    Parses filenames (as if concatenated in the given order, but each file is lexed on its own).
+    If cache_dir is given, the parse tables are stored there and reused while the files do not change. When they do
+    change, only the date blocks that were added or modified are parsed again.
+    :param jobs: number of worker processes, see iter_events
+    :param row_filter: optional parsing.RowFilter, the updates it rejects may be missing from df. Filtered loads are
+    not cached (but a valid snapshot of the full tables is used)
+    :return: (df, todos, postfixes, date_ascending, aliases, urls, order, tasks)
+    '''
+    if cache_dir:
+        tables = read_snapshot(cache_dir, filenames)
+        if tables is not None:
+            df, aliases = tables[0], tables[4]
+            warn_unused_aliases(df, aliases)
+            return tables
+    if row_filter is not None:
+        return tables_from_events(iter_events(filenames, None, jobs, row_filter), row_filter, warn_aliases=True)
+
+    if cache_dir:
+        fingerprints = [file_fingerprint(f) for f in filenames]
+        block_cache = read_block_cache(cache_dir, filenames)
+    else:
+        block_cache = None
+
+    tables = tables_from_events(iter_events(filenames, block_cache, jobs), warn_aliases=True)
+
+    if cache_dir:
+        write_block_cache(cache_dir, filenames, block_cache)
+        write_snapshot(cache_dir, filenames, fingerprints, tables)
+    return tables
@@ -1,8 +1,7 @@
+import hashlib
 import re
-import pandas as pd
 from datetime import datetime
 
-import renderer
 from utils import myassert, debug
 
 
@@ -10,24 +9,28 @@ TASK_SEPARATOR_INPUT = "::"  # TODO parametrise
 DONE_KEYWORDS = ["(CLOSED)", "(.)"]
 STANDBY_KEYWORDS = ["(STANDBY)", "(,)"]
 DONE_OR_STANDBY_KEYWORDS = DONE_KEYWORDS + STANDBY_KEYWORDS
+DONE_STATES = ["DONE", "STANDBY", "PENDING"]  # (open updates have no state)
 TODO_PREFIX = "#TODO "
 TODO_CONT_PREFIX = "#- "
 
+EPOCH_ORDINAL = datetime(1970, 1, 1).toordinal()
+
 date_rex = re.compile("^#\\s*(\\d+)[ /-](\\d+)[ /-](\\d+)\\n?$")
 
 
 def parse_date(line):
     new_date = None
-    date_m = re.search(date_rex, line)
+    date_m = date_rex.search(line)
     if date_m:
-        new_date = datetime.strptime(
-            "-".join([date_m.group(x) for x in range(1, 4)]), "%Y-%m-%d"
-        ).date()
+        new_date = datetime(*[int(x) for x in date_m.groups()]).date()
     return new_date
 
 
+task_split_input_rex = re.compile(f" *{TASK_SEPARATOR_INPUT} *")
+
+
 def task_split_input(tasks):
-    return re.split(f" *{TASK_SEPARATOR_INPUT} *", tasks)
+    return task_split_input_rex.split(tasks)
 
 
 def task_split_internal(tasks):
@@ -46,6 +49,24 @@ def task_join_external(tasks):
     return " / ".join(tasks)
 
 
+def task_targets(task, aliases):
+    '''
+    :param task: a task as given to --task, in internal ("a::b") or external ("a / b") form. The task, or its first
+    element, may be an alias key.
+    :return: set of the (internal) tasks it can stand for
+    '''
+    targets = set()
+    for path in (task_split_internal(task), task_split_external(task)):
+        joined = task_join_internal(path)
+        if joined in aliases:
+            targets.add(aliases[joined])
+        elif path[0] in aliases:
+            targets.add(task_join_internal([aliases[path[0]]] + path[1:]))
+        else:
+            targets.add(joined)
+    return targets
+
+
 
 # ------------------------------------------------------------------------------------------------------------
 # IO:
@@ -55,8 +76,92 @@ def task_join_external(tasks):
 # INIT PARSER:
 
 
-# REGEX expressions:
-regex_url = r"\b((?:https?://|www\d{0,3}[.]|[a-z0-9.\-]+[.][a-z]{2,4}/)(?:[^\s()<>]+|\(([^\s()<>]+|(\([^\s()<>]+\)))*\))+(?:\(([^\s()<>]+|(\([^\s()<>]+\)))*\)|[^\s`!()\[\]{};:'\".,<>?«»“”‘’]))"
+# URLS:
+# A URL is a prefix (http(s)://, www., or domain.tld/) followed by two or more units (characters other than
+# whitespace, parentheses and <>, or balanced parenthesis groups up to two levels deep), the last of which is either
+# a group or a character that does not end a sentence. This is the grammar of the usual URL regex, whose nested
+# quantifiers backtrack exponentially on long near-miss lines. Instead, the units are matched by a regex that never
+# backtracks (it has nothing after them to fail) and the end of the URL is found by stepping back over punctuation.
+URL_NOT_FINAL_CHARS = frozenset("`!()[]{};:'\".,<>?«»“”‘’")
+URL_DOMAIN_CHARS = frozenset("abcdefghijklmnopqrstuvwxyz0123456789.-")
+url_units_rex = re.compile(r"(?:[^\s()<>]+|\((?:[^\s()<>]|\([^\s()<>]+\))*\))*")
+url_group_rex = re.compile(r"\((?:[^\s()<>]|\([^\s()<>]+\))*\)")
+
+
+def _url_prefix_ends(s, i, ignorecase=False):
+    '''
+    :return: the positions where the URL body may start for a URL starting at s[i], one per prefix form matching
+    there (in the order the prefix forms are tried).
+    '''
+    if i >= len(s) or not (s[i].isalnum() or s[i] == "_"):
+        return []
+    ends = []
+    head = s[i:i + 8].lower() if ignorecase else s[i:i + 8]
+    if head.startswith("http://") or head.startswith("https://"):
+        ends.append(i + (7 if head[4] == ":" else 8))
+    if head.startswith("www"):
+        j = i + 3
+        while j < len(s) and s[j].isdecimal():
+            j += 1
+        if j - i - 3 <= 3 and j < len(s) and s[j] == ".":
+            ends.append(j + 1)
+    j = i
+    while j < len(s) and (s[j].lower() if ignorecase else s[j]) in URL_DOMAIN_CHARS:
+        j += 1
+    if j < len(s) and s[j] == "/":
+        domain = s[i:j]
+        for n in (2, 3, 4):
+            tld = domain[len(domain) - n:]
+            if len(domain) >= n + 2 and domain[-n - 1] == "." and tld.isascii() and tld.isalpha():
+                ends.append(j + 1)
+                break
+    return ends
+
+
+def match_url(s, i=0, ignorecase=False):
+    '''
+    :return: the end of the URL starting at s[i], or -1
+    '''
+    for start in _url_prefix_ends(s, i, ignorecase):
+        end = url_units_rex.match(s, start).end()
+        if end == start:
+            continue
+        if s[start] == "(":
+            first_unit_end = url_group_rex.match(s, start).end()
+        else:
+            first_unit_end = start + 1
+        while end > first_unit_end and s[end - 1] in URL_NOT_FINAL_CHARS and s[end - 1] != ")":
+            end -= 1
+        if end > first_unit_end:
+            return end
+    return -1
+
+
+space_split_rex = re.compile(r"(\s+)")
+
+
+def _expand_url_shorthand_word(word):
+    # the word ends at the last ":" followed by a URL (the ":"s after it are not followed by one, so there can be
+    # no other shorthand in the rest of the word)
+    colon = word.rfind(":")
+    while colon > 0:
+        end = match_url(word, colon + 1)
+        if end > 0:
+            return f"[{word[:colon]}]({word[colon + 1:end]}){word[end:]}"
+        colon = word.rfind(":", 0, colon)
+    return word
+
+
+def expand_url_shorthands(text):
+    '''
+    "word:URL" is a shortcut for the markdown link "[word](URL)"
+    '''
+    words = space_split_rex.split(text)
+    for i, word in enumerate(words):
+        if ":" in word:
+            words[i] = _expand_url_shorthand_word(word)
+    return "".join(words)
+
 
 # TASK LINE DEFINITION:
 done_exp = "|".join([re.escape(x) for x in DONE_OR_STANDBY_KEYWORDS])
@@ -69,202 +174,610 @@ line_parser_rex = re.compile(
 # [Alias] Task::{ POSTFIX|postfixes|}{  ORDER:order}{ *url}
 
 alias_rex = re.compile(
-    f"(?i)^\\[(?P<key>[^]]+)?\\][ \t]+(?P<task>.+){TASK_SEPARATOR_INPUT}[ \t]*(?P<url>{regex_url})?[ \t]*(?:DESC<(?P<desc>[^>]+)>)?[ \t]*(?:POSTFIX<(?P<postfixes>[^>]+)>)?[ \t]*(?:ORDER<(?P<order>[^>]+)>)?[ \t]*(?P<update>.+?)?{done_exp}$"
+    f"(?i)^\\[(?P<key>[^]]+)?\\][ \t]+(?P<task>.+){TASK_SEPARATOR_INPUT}[ \t]*(?P<tail>.*)$"
+)  # the url at the start of tail, if any, is found with match_url
+alias_tail_rex = re.compile(
+    f"(?i)^[ \t]*(?:DESC<(?P<desc>[^>]+)>)?[ \t]*(?:POSTFIX<(?P<postfixes>[^>]+)>)?[ \t]*(?:ORDER<(?P<order>[^>]+)>)?[ \t]*(?P<update>.+?)?{done_exp}$"
 )
 
-url_shorthand_rex = re.compile(f"(?P<word>[^\\s]+):(?P<url>{regex_url})")
-
-blank_rex = re.compile("^\\s*$")
-doclines = re.compile("^###+")
-
 
 def resolve_update(update):
     update = update.strip()
-    update = url_shorthand_rex.sub("[\\1](\\2)", update)
+    if ":" in update:
+        update = expand_url_shorthands(update)
     return update
 
 
+def expand_shortcut(line):
+    '''
+    "Key: update" is a shortcut for "Key:: update" (Key being a single word, e.g. an alias)
+    Same as re.sub(r"^([a-zA-Z]+):+ +", r"\1:: ", line), without running a regex on every line.
+    '''
+    i = line.find(":")
+    if i <= 0 or not (line[:i].isascii() and line[:i].isalpha()):
+        return line
+    j = i + 1
+    while j < len(line) and line[j] == ":":
+        j += 1
+    if j == len(line) or line[j] != " ":
+        return line
+    return line[:i] + ":: " + line[j:].lstrip(" ")
+
+
+def parse_alias(line):
+    '''
+    :return: None if line is not an alias definition, or (key, task, url, postfixes, order, update_line) where
+    update_line is the update given in the same line (rewritten as an update of the alias), or None.
+    '''
+    alias = alias_rex.search(line)
+    if not alias:
+        return None
+    tail = alias.group("tail")
+    url_end = match_url(tail, 0, ignorecase=True)
+    url = tail[:url_end] if url_end > 0 else None
+    d = alias_tail_rex.match(tail[max(url_end, 0):]).groupdict()
+    task = task_join_internal(task_split_input(alias.group("task")))
+    update_line = f"{alias.group('key')}:: {d['update']}" if d["update"] else None
+    return alias.group("key"), task, url, d["postfixes"], d["order"], update_line
+
+
+def parse_update_line(line):
+    '''
+    :return: (task, update, done)
+    '''
+    if line.startswith("["):  # bad alias line?
+        raise SyntaxError(f"Could not parse task alias line: [{line}]")
+    rex = line_parser_rex.search(line) if TASK_SEPARATOR_INPUT in line else None
+    if not rex:
+        raise SyntaxError
+    d = rex.groupdict()
+    tasklis = task_split_input(d["task"])
+    task = task_join_internal(tasklis)
+    done = None
+    if d["done"]:
+        dd = d["done"].strip()
+        if dd in DONE_KEYWORDS:
+            done = "DONE"
+        elif dd in STANDBY_KEYWORDS:
+            done = "STANDBY"
+        else:
+            myassert(False, f"UNKNOWN state VALUE: [{d['done']}]")
+    update = resolve_update(d["update"])
+    return task, update, done
+
+
 def parse_line(line, aliases, urls, postfixes, order):
     '''
     Returns (task, update, done) if an update is encountered (aliases will not be resolved yet).
     Updates (aliases, urls, postfixes, order) if an alias is encountered
     :return: None or  (task, update, done)
     '''
-    # PARSE
+    line = expand_shortcut(line)
 
-    ## shortcuts:
-    line = re.sub(r"^([a-zA-Z]+):+ +", r"\1:: ", line)
-
-    alias = alias_rex.search(line)
+    alias = parse_alias(line)
     if alias:
-        d = alias.groupdict()
-        task = task_join_internal(task_split_input(d["task"]))
-        aliases[d["key"]] = task
-        if "postfixes" in d and d["postfixes"]:
-            postfixes[task] = d["postfixes"]
-        if "url" in d and d["url"]:
-            urls[task] = d["url"]
-        if "order" in d and d["order"]:
-            order[task] = d["order"]
-
-        if "update" in d and d["update"]:
-            line = f"{d['key']}:: {d['update']}"
-        else:
+        key, task, url, postfix, order_prefix, line = alias
+        aliases[key] = task
+        if postfix:
+            postfixes[task] = postfix
+        if url:
+            urls[task] = url
+        if order_prefix:
+            order[task] = order_prefix
+        if not line:
             return None
 
-    if line.startswith("["):  # bad alias line?
-        raise SyntaxError(f"Could not parse task alias line: [{line}]")
+    return parse_update_line(line)
 
-    def _parse_update_line(line):
-        rex = line_parser_rex.search(line)
-        if not rex:
-            raise SyntaxError
-        d = rex.groupdict()
-        tasklis = task_split_input(d["task"])
-        task = task_join_internal(tasklis)
-        done = None
-        if d["done"]:
-            dd = d["done"].strip()
-            if dd in DONE_KEYWORDS:
-                done = "DONE"
-            elif dd in STANDBY_KEYWORDS:
-                done = "STANDBY"
-            else:
-                myassert(False, f"UNKNOWN state VALUE: [{d['done']}]")
-        update = resolve_update(d["update"])
-        return task, update, done
 
-    task, update, done = _parse_update_line(line)
+def todo(todos, limit=None):
+    '''
+    :param limit: print only the first limit TODOs (see renderer.head)
+    '''
+    import renderer  # (renderer imports reports, which imports parsing)
+    if len(todos) > 0:
+        renderer.printAndCopy("\n".join(todos), "TODO", limit)
 
-    return task, update, done
 
+def parse_file(string, row_filter=None):
+    '''
+    :param row_filter: optional RowFilter, the updates it rejects may be missing from df
+    '''
+    df, todos, postfixes, date_ascending, aliases, urls, order, tasks = parse_tables(string, row_filter=row_filter,
+                                                                                      warn_aliases=True)
+    return df, todos, postfixes, date_ascending, aliases
 
-def todo(todos):
-    if len(todos) > 0:
-        renderer.printAndCopy("\n".join(todos), "TODO")
 
+def warn_unused_aliases(df, aliases):
+    print_unused_aliases(aliases, set(df.Key))
 
-def parse_file(string):
-    date = None
-    data = []
-    todos = []
-    aliases = {}
-    urls = {}
-    postfixes = {}
-    order = {}
 
-    lines = string.split("\n")
+def print_unused_aliases(aliases, used_keys):
+    unused_aliases = [alias for alias in aliases if alias not in used_keys]
+    if unused_aliases:
+        print("WARNING: UNUSED ALIASES: [" + ", ".join(unused_aliases)+"]")
+
+
+def used_alias_keys(task_names, aliases, skipped_lines=()):
+    '''
+    :param task_names: the tasks of the updates
+    :param skipped_lines: update lines not parsed (rejected by a RowFilter), only those that can be the update of an
+    unused alias task are parsed
+    :return: the keys of the aliases whose task has updates (the Key column of the task table)
+    '''
+    task_to_key = {v: k for k, v in aliases.items()}
+    used = {task_to_key[task] for task in task_names if task in task_to_key}
+    heads = {}  # {head of the update lines of an unused alias task: its keys}
+    for task, key in task_to_key.items():
+        if key not in used:
+            for head in (key, task_split_internal(task)[0]):
+                heads.setdefault(head, set()).add(key)
+    for line in skipped_lines:
+        if not heads:
+            break
+        head = line[:line.find(TASK_SEPARATOR_INPUT)].rstrip(" ")
+        if TASK_SEPARATOR_INPUT not in line or head not in heads:
+            continue
+        try:
+            tasklis = task_split_internal(parse_update_line(line)[0])
+        except SyntaxError:
+            continue
+        if tasklis[0] in aliases:
+            tasklis[0] = aliases[tasklis[0]]
+        key = task_to_key.get(task_join_internal(tasklis))
+        if key is not None and key not in used:
+            used.add(key)
+            heads = {head: keys - {key} for head, keys in heads.items() if keys != {key}}
+    return used
+
+
+# ------------------------------------------------------------------------------------------------------------
+# STREAMING PARSER:
+# ------------------------------------------------------------------------------------------------------------
+
+# Parse events:
+DATE_EVENT = "date"  # (DATE_EVENT, date)
+ROW_EVENT = "row"  # (ROW_EVENT, date, task, update, done), task aliases not resolved yet
+ALIAS_EVENT = "alias"  # (ALIAS_EVENT, key, task, url, postfixes, order)
+TODO_EVENT = "todo"  # (TODO_EVENT, line)
+DEFERRED_EVENT = "deferred"  # (DEFERRED_EVENT, date, linenum, line), an update line not parsed yet, see RowFilter
+SKIPPED_EVENT = "skipped"  # (SKIPPED_EVENT, lines), update lines of a block rejected by a RowFilter (not parsed)
 
-    # Check date order, and sort lines in date order:
-    date_ascending, old_date, date1, date2 = (None, None, None, None)
-    linenum = 0
-    for line in lines:
-        linenum += 1
-        line = line.strip()
-        date_m = parse_date(line)
-        if date_m:
-            if not date1:
-                date1 = date_m
-                continue
-            if not date2:
-                date2 = date_m
-                date_ascending = date2 > date1
-                old_date = date2
-                continue
-            else:
 
-                if (date_ascending and old_date >= date_m) or (
-                        not date_ascending and old_date <= date_m
-                ):
-                    myassert(
-                        False,
-                        f"PARSE ERROR (LINE: {linenum}) Dates can be incremental or decremental but not both!\nLINE: {line}",
-                    )
-                old_date = date_m
-
-    # Parse updates
-    linenum = 0
-    doclines_on = False
+class RowFilter:
+    '''
+    Predicate pushed down into the parser: only the updates dated between startdate and enddate, of task (a task or
+    alias, as given to --task) and containing substring are needed. It is conservative (some updates that do not
+    match are kept, the caller still filters them) but updates that can match are never dropped:
+    - blocks outside the date range only keep their alias definitions, TODOs and pending marks (which apply to all the
+    updates of a task)
+    - update lines not starting with the task or not containing substring are deferred (DEFERRED_EVENT) without
+    running the update regexes, until the aliases and postfixes they could match through are known (see
+    accepts_deferred)
+    '''
+
+    def __init__(self, startdate=None, enddate=None, task=None, substring=None):
+        self.startdate, self.enddate, self.task = startdate, enddate, task
+        self.heads = None
+        if task:
+            self.heads = {task_split_internal(t)[0].strip() for t in self.targets({})}
+        # url shorthands insert brackets, so a substring with brackets can not be looked for in the raw line:
+        self.substring = substring if substring and not any(c in substring for c in "[]()") else None
+
+    def targets(self, aliases):
+        return task_targets(self.task, aliases)
+
+    def accepts_date(self, date):
+        return date is None or (
+            (self.startdate is None or date >= self.startdate) and (self.enddate is None or date <= self.enddate)
+        )
+
+    def accepts_line(self, line):
+        '''
+        :param line: an update line (with shortcuts expanded)
+        '''
+        if self.heads is not None and TASK_SEPARATOR_INPUT in line:
+            if line[:line.find(TASK_SEPARATOR_INPUT)].rstrip(" ") not in self.heads:
+                return False
+        return self.substring is None or self.substring in line
+
+    def accepts_deferred(self, line, aliases, postfixes):
+        '''
+        :return: whether a line rejected by accepts_line can still match once aliases and postfixes are known.
+        '''
+        if self.heads is not None:
+            head = line[:line.find(TASK_SEPARATOR_INPUT)].rstrip(" ")
+            head = aliases[head] if head in aliases else head
+            if not any(t == head or t.startswith(head + TASK_SEPARATOR_INPUT) or head.startswith(t + TASK_SEPARATOR_INPUT)
+                       for t in self.targets(aliases)):
+                return False
+        if self.substring is not None and self.substring not in line:
+            # the substring can only come from a text postfix, appended as " " + postfix
+            return any(
+                self.substring in f" {postfix}" or any(f" {postfix}".startswith(self.substring[k:])
+                                                       for k in range(1, len(self.substring)))
+                for postfix in postfixes.values() if postfix not in DONE_OR_STANDBY_KEYWORDS
+            )
+        return True
+
+
+class DateOrder:
+    '''
+    Checks that dates are either incremental or decremental.
+    '''
+
+    def __init__(self):
+        self.date_ascending, self.old_date, self.date1, self.date2 = (None, None, None, None)
+
+    def check(self, date, linenum, line):
+        if not self.date1:
+            self.date1 = date
+        elif not self.date2:
+            self.date2 = date
+            self.date_ascending = self.date2 > self.date1
+            self.old_date = self.date2
+        else:
+            if (self.date_ascending and self.old_date >= date) or (
+                    not self.date_ascending and self.old_date <= date
+            ):
+                myassert(
+                    False,
+                    f"PARSE ERROR (LINE: {linenum}) Dates can be incremental or decremental but not both!\nLINE: {line}",
+                )
+            self.old_date = date
+
+
+def iter_blocks(lines, date_lines=None, linenum=0, doclines_on=False):
+    '''
+    Lexer: classifies each line by its first character (running the date regex only on candidate date lines), drops
+    comments and blank lines, checks the date order and splits the remaining lines into date blocks, each starting at a
+    date line (the first block holds the lines before the first date, the alias header).
+    :param date_lines: optional list where (linenum, date, line) is appended for every date line
+    :param linenum, doclines_on: number of lines before lines and whether they are in a ### comment block (when lexing
+    from the middle of a file)
+    :return: generator of (date, lines) where lines is a list of (linenum, stripped line) with updates, alias
+    definitions and TODO lines.
+    '''
+    date_order = DateOrder()
+
+    date = None
+    block_lines = []
     for line in lines:
         linenum += 1
         line = line.strip()
-
-        if doclines.match(line):
-            doclines_on = not doclines_on
+        if not line:
             continue
 
-        if doclines_on:
+        first = line[0]
+        if first != "#":
+            if not doclines_on:
+                block_lines.append((linenum, line))
             continue
 
-        if re.match(r'^#?TODO', line):
-            todos.append(line)
+        if line.startswith("###"):
+            doclines_on = not doclines_on
             continue
 
-        date_m = parse_date(line)
+        date_m = parse_date(line) if line[1:].lstrip()[:1].isdigit() else None
         if date_m:
-            date = date_m
+            # Dates are checked even when commented out in a comment block
+            date_order.check(date_m, linenum, line)
+            if date_lines is not None:
+                date_lines.append((linenum, date_m, line))
+
+        if doclines_on:
             continue
+        if date_m:
+            yield date, block_lines
+            date, block_lines = date_m, []
+        elif line.startswith("#TODO"):
+            block_lines.append((linenum, line))
+    yield date, block_lines
 
-        if line.startswith("#") or blank_rex.match(line):
+
+def block_hash(date, lines):
+    h = hashlib.sha1(f"{date}\n".encode("utf-8"))
+    for _, line in lines:
+        h.update(line.encode("utf-8"))
+        h.update(b"\n")
+    return h.hexdigest()
+
+
+def parse_block(date, lines, row_filter=None):
+    '''
+    Parses the (lexed) lines of one date block. Aliases are not resolved here (they may be defined in any block), so
+    the result only depends on the block itself and can be reused while the block does not change.
+    :param row_filter: optional RowFilter, update lines it rejects are skipped or deferred
+    :return: list of parse events
+    '''
+    events = [(DATE_EVENT, date)] if date else []
+    in_range = row_filter is None or row_filter.accepts_date(date)
+    skipped = []
+
+    for linenum, line in lines:
+        first = line[0]
+        if first == "#" or (first == "T" and line.startswith("TODO")):
+            events.append((TODO_EVENT, line))
             continue
 
         try:
-            res = parse_line(line, aliases, urls, postfixes, order)
+            if first == "[":
+                alias = parse_alias(line)
+                if not alias:
+                    raise SyntaxError(f"Could not parse task alias line: [{line}]")
+                events.append((ALIAS_EVENT,) + alias[:5])
+                line = alias[5]
+                if not line:
+                    continue
+            else:
+                line = expand_shortcut(line)
+                if row_filter is not None and date and "(!)" not in line:  # (pending marks apply to the whole task)
+                    if not in_range:
+                        skipped.append(line)
+                        continue
+                    if not row_filter.accepts_line(line):
+                        events.append((DEFERRED_EVENT, date, linenum, line))
+                        continue
+            task, update, done = parse_update_line(line)
         except SyntaxError:
             myassert(False, f"PARSE ERROR (LINE: {linenum}):\n{line}")
-        if res:
-            task, update, done = res
-            if update:
-                myassert(
-                    date,
-                    f"PARSE ERROR (LINE: {linenum}) No date line present before the first update!\nLINE: |{line}|"
-                )
+        if update:
+            myassert(
+                date,
+                f"PARSE ERROR (LINE: {linenum}) No date line present before the first update!\nLINE: |{line}|"
+            )
+
+        events.append((ROW_EVENT, date, task, update, done))
+    if skipped:
+        events.append((SKIPPED_EVENT, skipped))
+    return events
 
-            data.append([date, task, update, done])
-    DATE, TASK, UPDATE, DONE = (0, 1, 2, 3)
 
+def parse_stream(lines, block_cache=None, row_filter=None):
+    '''
+    Parses an iterable of lines (e.g. an open file) lazily, one date block at a time.
+    :param block_cache: optional dict of previously parsed blocks (by block_hash), only new or modified blocks are
+    parsed. Once the stream is consumed it holds the blocks of these lines.
+    :param row_filter: optional RowFilter (see parse_block), the block cache is not used with it
+    :return: generator of parse events
+    '''
+    if row_filter is not None:
+        block_cache = None
+    used_blocks = {}
+    for block in iter_blocks(lines):
+        if block_cache is None:
+            yield from parse_block(*block, row_filter)
+            continue
+        key = block_hash(*block)
+        events = block_cache.get(key)
+        if events is None:
+            events = parse_block(*block)
+        used_blocks[key] = events
+        yield from events
+    if block_cache is not None:
+        block_cache.clear()
+        block_cache.update(used_blocks)
+
+
+def parse_tables(string, block_cache=None, row_filter=None, warn_aliases=False):
+    '''
+    Parses the update file content.
+    :param row_filter: optional RowFilter, the updates it rejects may be missing from df
+    :param warn_aliases: see collect_events
+    :return: (df, todos, postfixes, date_ascending, aliases, urls, order, tasks)
+    '''
+    return tables_from_events(parse_stream(string.split("\n"), block_cache, row_filter), row_filter, warn_aliases)
 
-    # Resolve aliases as postfixes and format updates
-    for datum in data:
-        task = datum[TASK]
+
+def collect_events(events, row_filter=None, warn_aliases=False):
+    '''
+    Collects parse events into plain update columns, shared by the table engines (pandas here, and lite).
+    Aliases, postfixes and states are resolved once per task (as written in the updates, aliases may be defined after
+    their first use) instead of once per update.
+    :param row_filter: the RowFilter the events were parsed with, if any (to resolve deferred update lines)
+    :param warn_aliases: print the aliases whose task has no updates, including the updates rejected by row_filter
+    :return: (columns, todos, postfixes, date_ascending, aliases, urls, order, task_rows). columns holds the lists
+    Day (date ordinals, 0 if no date), TaskId, Update and State (codes into DONE_STATES, -1 if open) of the updates, as
+    written. task_rows holds the (Task, Key, Order, URL, State, Postfix) of each TaskId: a State code (not -1) replaces
+    the states of all the task updates, and Postfix (if not empty) is appended to their text.
+    '''
+    todos = []
+    aliases = {}
+    urls = {}
+    postfixes = {}
+    order = {}
+    date_ascending, date1 = (None, None)
+
+    # updates:
+    days = []  # date ordinals (0 if no date)
+    raw_ids = []  # ids into raw_tasks
+    updates = []
+    states = []  # codes into DONE_STATES (-1 if None)
+    # tasks as written in the updates (aliases not resolved):
+    raw_task_ids = {}
+    raw_tasks = []
+    raw_pending = []
+    deferred = []  # (row, DEFERRED_EVENT)
+    skipped = []  # update lines rejected by row_filter
+
+    def raw_task_id(task, update):
+        raw_id = raw_task_ids.get(task)
+        if raw_id is None:
+            raw_id = raw_task_ids[task] = len(raw_tasks)
+            raw_tasks.append(task)
+            raw_pending.append(False)
+        if "(!)" in update:
+            raw_pending[raw_id] = True
+        return raw_id
+
+    state_codes = {state: code for code, state in enumerate(DONE_STATES)}
+    state_codes[None] = -1
+    for event in events:
+        kind = event[0]
+        if kind == ROW_EVENT:
+            _, date, task, update, done = event
+            days.append(date.toordinal() if date else 0)
+            raw_ids.append(raw_task_id(task, update))
+            updates.append(update)
+            states.append(state_codes[done])
+        elif kind == DEFERRED_EVENT:
+            deferred.append((len(days), event))
+            days.append(event[1].toordinal())
+            raw_ids.append(-1)
+            updates.append(None)
+            states.append(-1)
+        elif kind == ALIAS_EVENT:
+            _, key, task, url, postfix, order_prefix = event
+            aliases[key] = task
+            if postfix:
+                postfixes[task] = postfix
+            if url:
+                urls[task] = url
+            if order_prefix:
+                order[task] = order_prefix
+        elif kind == TODO_EVENT:
+            todos.append(event[1])
+        elif kind == SKIPPED_EVENT:
+            skipped.extend(event[1])
+        elif kind == DATE_EVENT:
+            if not date1:
+                date1 = event[1]
+            elif date_ascending is None:
+                date_ascending = event[1] > date1
+
+    # Deferred update lines, parsed if they can match row_filter now that all aliases and postfixes are known:
+    if deferred:
+        keep = [True] * len(days)
+        for row, (_, date, linenum, line) in deferred:
+            if not row_filter.accepts_deferred(line, aliases, postfixes):
+                keep[row] = False
+                skipped.append(line)
+                continue
+            try:
+                task, update, done = parse_update_line(line)
+            except SyntaxError:
+                myassert(False, f"PARSE ERROR (LINE: {linenum}):\n{line}")
+            raw_ids[row] = raw_task_id(task, update)
+            updates[row] = update
+            states[row] = state_codes[done]
+        days, raw_ids, updates, states = (
+            [x for x, k in zip(column, keep) if k] for column in (days, raw_ids, updates, states)
+        )
+
+    # Resolve aliases:
+    resolved = []
+    for task in raw_tasks:
         tasklis = task_split_internal(task)
         key = tasklis[0]
         if key in aliases:
             tasklis[0] = aliases[key]
-            task = datum[TASK] = task_join_internal(tasklis)
-        if task in postfixes:
-            POSTFIX = postfixes[task]
-            if POSTFIX in DONE_KEYWORDS:
-                datum[DONE] = "DONE"
-            elif POSTFIX in STANDBY_KEYWORDS:
-                datum[DONE] = "STANDBY"
-            else:
-                datum[UPDATE] += " " + POSTFIX
+            task = task_join_internal(tasklis)
+        resolved.append(task)
+
+    # Task table, updates refer to it by TaskId:
+    task_rows = task_rows_table(set(resolved), aliases, urls, order)
+    if warn_aliases:
+        print_unused_aliases(aliases, used_alias_keys(set(resolved), aliases, skipped))
+    task_index = {row[0]: task_id for task_id, row in enumerate(task_rows)}
+    raw_to_task_id = [task_index[task] for task in resolved]
+    task_ids = [raw_to_task_id[raw_id] for raw_id in raw_ids]
+
+    # Per task states (postfixes and pending) and text postfixes:
+    task_states = [-1] * len(task_rows)
+    task_postfixes = [""] * len(task_rows)
+    pending = [False] * len(task_rows)
+    for raw_id, raw_task_pending in enumerate(raw_pending):
+        if raw_task_pending:
+            pending[raw_to_task_id[raw_id]] = True
+    for task, postfix in postfixes.items():
+        if task not in task_index:
+            continue
+        task_id = task_index[task]
+        if postfix in DONE_KEYWORDS:
+            task_states[task_id] = state_codes["DONE"]
+        elif postfix in STANDBY_KEYWORDS:
+            task_states[task_id] = state_codes["STANDBY"]
+        else:
+            task_postfixes[task_id] = " " + postfix
+            if "(!)" in postfix:
+                pending[task_id] = True
+    for task_id in range(len(task_rows)):
+        if pending[task_id]:
+            task_states[task_id] = state_codes["PENDING"]
+    task_rows = [row + (state, postfix) for row, state, postfix in zip(task_rows, task_states, task_postfixes)]
 
-    df = pd.DataFrame(data, columns=["Date", "Task", "Update", "Done"])
-    df.Date = pd.to_datetime(df.Date)
+    columns = {"Day": days, "TaskId": task_ids, "Update": updates, "State": states}
+    return columns, todos, postfixes, date_ascending, aliases, urls, order, task_rows
 
-    # Set "pending" state
-    pending_tasks = df[df.Update.str.contains(re.escape("(!)"))].Task.to_list()
-    df.loc[df.Task.isin(pending_tasks), "Done"] = "PENDING"
 
-    # add Keys (for display):
+def tables_from_events(events, row_filter=None, warn_aliases=False):
+    '''
+    Collects parse events into the update DataFrame (see collect_events).
+    :return: (df, todos, postfixes, date_ascending, aliases, urls, order, tasks)
+    '''
+    # (numpy and pandas are only imported here, so that the lite engine can run the parser without them)
+    import numpy as np
+    import pandas as pd
+
+    columns, todos, postfixes, date_ascending, aliases, urls, order, task_rows = collect_events(events, row_filter,
+                                                                                               warn_aliases)
+    tasks = task_table(task_rows)
+    task_ids = np.array(columns["TaskId"], dtype="int32")
+    updates = columns["Update"]
+    for task_id in np.flatnonzero(tasks.Postfix.to_numpy() != ""):
+        postfix = tasks.Postfix.iat[task_id]
+        for i in np.flatnonzero(task_ids == task_id):
+            updates[i] += postfix
+    task_states = tasks.State.to_numpy(dtype="int8")[task_ids]
+    states = np.where(task_states >= 0, task_states, np.array(columns["State"], dtype="int8"))
+
+    days = np.array(columns["Day"], dtype="int64")
+    dates = (days - EPOCH_ORDINAL).astype("datetime64[D]")
+    dates[days == 0] = np.datetime64("NaT")
+
+    df = pd.DataFrame({
+        "Date": pd.to_datetime(dates),
+        "Task": pd.Categorical.from_codes(task_ids, categories=tasks.Task),
+        "Update": updates,
+        "Done": pd.Categorical.from_codes(states, categories=DONE_STATES),
+        "Key": per_task_column(tasks.Key, task_ids),
+        "Order": per_task_column(tasks.Order, task_ids, ordered=True),
+        "URL": per_task_column(tasks.URL, task_ids),
+        "TaskId": task_ids,
+    })
+
+    return df, todos, postfixes, date_ascending, aliases, urls, order, tasks[["Task", "Key", "Order", "URL"]]
+
+
+def task_rows_table(task_names, aliases, urls, order):
+    '''
+    :return: [(Task, Key, Order, URL)] of the tasks, sorted by TaskId. Ids follow the (Order, Task, URL) sort order used
+    by reports, so sorting updates by TaskId sorts them by task.
+    '''
     task_to_key = {v: k for k, v in aliases.items()}
-    df["Key"] = [
-        task_to_key[task] if task in task_to_key else None for task in df.Task.tolist()
-    ]
-    df["Order"] = [
-        order[task] + task if task in order else task for task in df.Task.tolist()
-    ]
-    df["URL"] = [urls[task] if task in urls else "" for task in df.Task.tolist()]
-
-
-    # Check unused Task aliases
-    used_tasks = set(df.Key.tolist())
-    unused_aliases = [alias for alias in aliases if alias not in used_tasks]
-    if unused_aliases:
-        print("WARNING: UNUSED ALIASES: [" + ", ".join(unused_aliases)+"]")
+    rows = sorted(
+        (order[task] + task if task in order else task, task, urls[task] if task in urls else "")
+        for task in task_names
+    )
+    return [(task, task_to_key.get(task), order_key, url) for order_key, task, url in rows]
 
 
+def task_table(task_rows):
+    '''
+    :return: DataFrame of the task_rows (see collect_events) indexed by TaskId
+    '''
+    import pandas as pd
 
-    return df, todos, postfixes, date_ascending, aliases
+    tasks = pd.DataFrame(task_rows, columns=["Task", "Key", "Order", "URL", "State", "Postfix"])
+    tasks.index.name = "TaskId"
+    return tasks
+
+
+def per_task_column(values, task_ids, ordered=False):
+    '''
+    Categorical column of per-task values (indexed by TaskId) for the given task ids.
+    '''
+    import pandas as pd
+
+    codes, categories = pd.factorize(values, sort=ordered)
+    return pd.Categorical.from_codes(codes[task_ids], categories=categories, ordered=ordered)
@@ -0,0 +1,180 @@
+"""
+Query planning: the CLI commands are compiled into a plan of steps, all run on the same Dataset so that they share its
+indexes (task sorted rows, latest states, day ordinals) instead of each sorting and grouping the updates again.
+"""
+import os
+import re
+from datetime import datetime
+
+import renderer
+from parsing import todo
+from utils import last_day, last_week_span, myassert, this_week_span
+
+COMMANDS_LIST = ["o[pen]", "pending", "standby", "closed", "y[esterday]", "today", "thisweek", "[last]week",
+                 "<k>w[eeks]", "span <date-start> <date-end>", "weekly-range <date-start> <date-end>", "tasks",
+                 "tr/tasks_recent", "stats", "todo"]
+
+COMMAND_NAMES = {
+    "all": "all", "pending": "pending", "thisweek": "thisweek", "lastweek": "lastweek", "week": "lastweek",
+    "w": "lastweek", "yesterday": "yesterday", "y": "yesterday", "today": "today", "span": "span", "open": "open",
+    "o": "open", "standby": "standby", "closed": "closed", "tasks": "tasks", "tasks_recent": "tasks_recent",
+    "tr": "tasks_recent", "todo": "todo", "weekly-range": "weekly_range",
+    "stats": "stats",
+}
+
+LITE_STEPS = {"all", "pending", "thisweek", "lastweek", "yesterday", "today", "span", "open", "standby", "closed",
+              "tasks", "tasks_recent", "todo", "unknown"}  # steps the lite engine can run
+
+
+def compile_plan(commands):
+    '''
+    :return: list of steps (name, args), one per command: names are the canonical command names (or "unknown") and
+    args the parsed command arguments.
+    '''
+    plan = []
+    i = 0
+    while i < len(commands):
+        command = commands[i]
+        i += 1
+        m_k = re.fullmatch("(?P<k>[0-9]+)w(?:eeks)?", command)
+        name = COMMAND_NAMES.get(command, "unknown")
+        args = ()
+        if m_k:
+            name, args = "lastweek", (int(m_k.groupdict()["k"]),)
+        elif name == "lastweek":
+            args = (1,)
+        elif name in ("span", "weekly_range"):
+            myassert(i + 2 <= len(commands), f"{command} needs <date-start> <date-end>")
+            args = tuple(datetime.strptime(date, '%Y-%m-%d') for date in commands[i:i + 2])
+            i += 2
+        elif name == "unknown":
+            args = (command,)
+        plan.append((name, args))
+    return plan
+
+
+def step_span(step, now):
+    '''
+    :return: (startdate, enddate) of the updates reported by step ((None, None) for all of them), None if it does not
+    report a span of updates
+    '''
+    name, args = step
+    if name == "today":
+        return now, now
+    if name == "yesterday":
+        day = last_day(now)
+        return day, day
+    if name == "thisweek":
+        return this_week_span(now)
+    if name == "lastweek":
+        return last_week_span(now, *args)
+    if name == "span":
+        return args
+    if name == "weekly_range":
+        startdate, enddate = args
+        return this_week_span(startdate)[0], this_week_span(enddate)[1]
+    if name in ("all", "pending"):
+        return None, None
+    return None
+
+
+def plan_span(plan, now):
+    '''
+    :return: (startdate, enddate) covering the dates reported by plan, or None if some step needs all dates.
+    '''
+    spans = [step_span(step, now) for step in plan]
+    if not spans or any(span is None or None in span for span in spans):
+        return None
+    return min(s for s, _ in spans).date(), max(e for _, e in spans).date()
+
+
+def run_plan(plan, data, todos, postfixes, now, output_dir=None, engine=None, limit=None):
+    '''
+    Prints (and copies) the report of each step of plan. The span reports use the rows of the span covering all of
+    them, sorted by task once.
+    :param output_dir: if given, weekly-range writes each week's report to a file there instead of printing it
+    :param engine: module with the reports, reports (pandas, data being a Dataset) by default or lite (data being a
+    lite.Table, see LITE_STEPS)
+    :param limit: print only the first limit lines of each report and of each TODO list (span reports stop walking
+    their task tree there)
+    '''
+    if engine is None:
+        import reports as engine
+    spans = [step_span(step, now) for step in plan if step[0] != "pending"]
+    spans = [span for span in spans if span is not None]
+    if spans:
+        starts, ends = zip(*spans)
+        data.cover(None if None in starts else min(starts), None if None in ends else max(ends))
+
+    for name, args in plan:
+        if name == "all":
+            title, txt = engine.write_report_span(data, None, None, stream=True)
+            renderer.printAndCopy(txt, title=title, limit=limit)
+            todo(todos, limit)
+
+        elif name == "pending":
+            title, txt = engine.write_report_span(data.pending(), None, None, stream=True)
+            renderer.printAndCopy(txt, title=title, limit=limit)
+
+        elif name == "thisweek":
+            title, txt = engine.report_this_week(data, now, stream=True)
+            renderer.printAndCopy(txt, title=title, limit=limit)
+            todo(todos, limit)
+
+        elif name == "lastweek":
+            title, txt = engine.report_last_week(data, now, *args, stream=True)
+            renderer.printAndCopy(txt, title=title, limit=limit)
+            todo(todos, limit)
+
+        elif name == "yesterday":
+            title, txt = engine.report_last_day(data, now, stream=True)
+            renderer.printAndCopy(txt, title=title, limit=limit)
+            todo(todos, limit)
+
+        elif name == "today":
+            title, txt = engine.report_today(data, now, stream=True)
+            renderer.printAndCopy(txt, title=title, limit=limit)
+            todo(todos, limit)
+
+        elif name == "span":
+            title, txt = engine.write_report_span(data, *args, stream=True)
+            renderer.printAndCopy(txt, title=title, limit=limit)
+            todo(todos, limit)
+
+        elif name == "weekly_range":
+            weeks = engine.report_weeks(data, *args)
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
+                for monday, title, txt in weeks:
+                    year, week, _ = monday.isocalendar()
+                    filename = os.path.join(output_dir, f"week_{year}-W{week:02d}.md")
+                    renderer.save(txt, filename, title=title)
+                print(f"WROTE {len(weeks)} WEEKLY REPORTS TO {output_dir}")
+            else:
+                renderer.printAndCopy_all([(title, txt) for _, title, txt in weeks], limit)
+
+        elif name == "open":
+            renderer.printAndCopy(engine.report_completion_tasks(data, None), "OPEN TASKS", limit)
+            todo(todos, limit)
+
+        elif name == "standby":
+            renderer.printAndCopy(engine.report_completion_tasks(data, "STANDBY"), "STANDBY TASKS", limit)
+            todo(todos, limit)
+
+        elif name == "closed":
+            renderer.printAndCopy(engine.report_completion_tasks(data, "DONE"), "CLOSED TASKS", limit)
+
+        elif name == "tasks":
+            renderer.printAndCopy(engine.report_tasks(data, postfixes, now), "TASKS", limit)
+
+        elif name == "tasks_recent":
+            renderer.printAndCopy(engine.report_tasks(data, postfixes, now, 10), "TASKS", limit)
+
+        elif name == "stats":
+            renderer.printAndCopy(engine.report_stats(data, now), "STATS", limit)
+
+        elif name == "todo":
+            renderer.printAndCopy("\n".join(todos), "TODO", limit)
+
+        else:
+            print(f"UNKNOWN COMMAND [{args[0]}]. DEFINED COMMANDS: {', '.join(COMMANDS_LIST)}")
@@ -13,11 +13,9 @@ import shutil
 import sys
 from datetime import datetime
 
-import pandas as pd
-from loguru import logger
-
-import renderer
-import reports
+import clipboard
+import loader
+import planner
 from parsing import *
 from utils import myassert, debug
 
@@ -27,8 +25,7 @@ from utils import myassert, debug
 app_name = "QuickUpdate"
 version_name = "v1.1"
 err_pre = "INPUT DATA ERROR:"
-
-pd.set_option('display.max_columns', None)
+README = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "README.md")
 
 
 # ------------------------------------------------------------------------------------------------------------
@@ -93,29 +90,44 @@ def error_and_quit(txt):
     sys.exit(1)
 
 
-def main():
+WINDOW_COMMANDS = ["today", "yesterday", "y", "thisweek"]
+LITE_MAX_BYTES = 1 << 20  # below this, importing pandas takes longer than parsing and reporting without it
+
+
+def choose_engine(engine, filenames, plan, cache_dir=None):
+    '''
+    :return: "pandas" or "lite": engine if given, else lite for small uncached inputs whose commands it can run
+    '''
+    if engine:
+        unsupported = [name for name, _ in plan if name not in planner.LITE_STEPS]
+        myassert(engine == "pandas" or not unsupported, f"COMMANDS NOT SUPPORTED BY THE LITE ENGINE: {unsupported}")
+        return engine
+    if cache_dir or any(name not in planner.LITE_STEPS for name, _ in plan):
+        return "pandas"
+    return "lite" if sum(os.path.getsize(filename) for filename in filenames) <= LITE_MAX_BYTES else "pandas"
 
-    with open('README.md', 'r') as file:
-        readme_content = file.read()
 
+class HelpParser(argparse.ArgumentParser):
+    '''
+    ArgumentParser whose description (with the README) is only read when the help is printed.
+    '''
 
-#    print(readme_content)
-#    sys.exit()
+    def format_help(self):
+        with open(README, 'r') as file:
+            readme_content = file.read()
+        self.description = f"QuickUpdate {version_name}: https://github.com/hugozaragoza/quick-update\n\n"+readme_content
+        return super().format_help()
 
-    commands_list = ["o[pen]", "pending", "standby", "closed", "y[esterday]", "today", "thisweek", "[last]week",
-                     "<k>w[eeks]",
-                     "span <date-start> <date-end>", "tasks", "tr/tasks_recent", "todo"]
 
-    ap = argparse.ArgumentParser(
-        description=f"QuickUpdate {version_name}: https://github.com/hugozaragoza/quick-update\n\n"+readme_content,
-        formatter_class=argparse.RawTextHelpFormatter
-        )
+def main():
+
+    ap = HelpParser(formatter_class=argparse.RawTextHelpFormatter)
 
     ap.add_argument(
         "commands",
         type=str,
         nargs="+",
-        help=", ".join(commands_list),
+        help=", ".join(planner.COMMANDS_LIST),
     )
 
     ap.add_argument(
@@ -133,15 +145,69 @@ def main():
     ap.add_argument(
         "--task",
         required=False,
-        help="Filter to only this task (or task alias)",
+        help="Filter to this task (or task alias) and its subtasks, e.g. \"Project Two / Infra\" or \"PT / Infra\"",
     )
     ap.add_argument(
         "--filter",
         required=False,
         help="Filter to any task or update containing this substring",
     )
+    ap.add_argument(
+        "--search",
+        required=False,
+        help="Filter to the updates whose text or task has all these words (e.g. \"legal contract\"). OR separates\n"
+             "alternatives and a word ending with * matches any word with that prefix. Uses a word index (stored in\n"
+             "--cache-dir)",
+    )
+    ap.add_argument(
+        "--cache-dir",
+        required=False,
+        help="Directory where parse results are cached between runs (re-parsed only when the files change). A file\n"
+             "whose size and modification time did not change is only checked at its start and end (64 KB each)",
+    )
+    ap.add_argument(
+        "--jobs",
+        type=int,
+        required=False,
+        help="Number of processes used to parse the files (default: one per core for large inputs)",
+    )
+    ap.add_argument(
+        "--window",
+        action="store_true",
+        help="For today, y[esterday] and thisweek: only read the dates they report (and the alias header before the\n"
+             "first date). TODOs, pending marks (!) and alias definitions in other dates are ignored, so the done\n"
+             "and pending marks of the reported updates can differ from a full load (e.g. a task marked pending in an\n"
+             "older update is not shown as pending)",
+    )
+    ap.add_argument(
+        "--output-dir",
+        required=False,
+        help="For weekly-range: write each week's report to a file in this directory instead of printing them",
+    )
+    ap.add_argument(
+        "--limit",
+        "--head",
+        type=int,
+        required=False,
+        help="Print only the first LIMIT lines of each report (reports are printed as they are written)",
+    )
+    ap.add_argument(
+        "--clipboard",
+        default="auto",
+        help="Where the reports are copied (all the reports of a command line at once): pbcopy, xclip, wl-copy,\n"
+             f"osc52 (terminal escape sequence), file[:<path>] (default {clipboard.DEFAULT_FILE}) or none.\n"
+             "Default: auto, the first available of pbcopy, wl-copy, xclip and osc52 (in ssh sessions)",
+    )
+    ap.add_argument(
+        "--engine",
+        choices=["pandas", "lite"],
+        required=False,
+        help="Report engine: pandas, or lite (plain Python, faster to start; no --cache-dir, stats or weekly-range).\n"
+             f"Default: lite for update files up to {LITE_MAX_BYTES >> 20}MB, pandas otherwise",
+    )
     args = vars(ap.parse_args())
     files = args["update_file"]
+    clipboard.configure(args["clipboard"])
 
     if (args['now']):
         global _now
@@ -157,111 +223,55 @@ def main():
         return
 
     print(f"FILES: {files}")
-    file_content = ''
     files_matched = sorted(glob.glob(files),reverse=True)
     if not files_matched:
         error_and_quit(f"\nNo files found of: {files}")
 
-    for filename in files_matched:
-        # print(f"  FILES: {filename}")
-        with open(filename, "r") as _file:
-            file_content += _file.read()+"\n"
-    df, todos, postfixes, date_ascending, aliases = parse_file(file_content)
+    plan = planner.compile_plan(args["commands"])
+    span = planner.plan_span(plan, _now)
+    lite = choose_engine(args["engine"], files_matched, plan, args["cache_dir"]) == "lite"
+    if lite:
+        import lite as engine
+    else:
+        import pandas as pd
+        import reports as engine
+        from dataset import Dataset
+        pd.set_option('display.max_columns', None)
+
+    filtered = True  # (whether tables may miss updates, filtered below)
+    if args["window"] and span and all(c in WINDOW_COMMANDS for c in args["commands"]):
+        tables = (engine.load_window if lite else loader.load_window)(files_matched, *span)
+    else:
+        row_filter = None
+        # (with --cache-dir, --search loads all the updates so that the word index of all of them is cached)
+        if (span or args["task"] or args["filter"]) and not (args["search"] and args["cache_dir"]):
+            row_filter = RowFilter(*(span or (None, None)), args["task"], args["filter"])
+        filtered = row_filter is not None
+        if lite:
+            tables = engine.load(files_matched, args["jobs"], row_filter)
+        else:
+            tables = loader.load(files_matched, args["cache_dir"], args["jobs"], row_filter)
+    df, todos, postfixes, date_ascending, aliases, urls, order, tasks = tables
+    data = df if lite else Dataset(df)
+
+    if args['search']:
+        index = loader.load_search_index(args["cache_dir"], files_matched, df, filtered)
+        data = data.take(index.search(args['search']))
+        print(f"SEARCHING FOR [{args['search']}] ({len(data)}  rows)")
 
     if args['task']:
         task = args['task']
         if task in aliases:
             task = aliases[task]
-        task2 = task_join_internal(task_split_external(task))
-        df = df[(df.Task == task) | (df.Task == task2)]
-        print(f"FILTERING BY task==[{task}] ({len(df)}  rows)")
+        data = data.filter_task(args['task'], aliases)
+        print(f"FILTERING BY task==[{task}] ({len(data)}  rows)")
 
     if args['filter']:
-        df = df[df.Update.str.contains(re.escape(args['filter']))]
-        print(f"FILTERING BY search string [{args['filter']}] ({len(df)}  rows)")
-
-    args_to_skip = 0
-    for i in range(len(args["commands"])):
-        if args_to_skip > 0:
-            args_to_skip -= 1
-            continue
-
-        command = args["commands"][i]
-        m_k = re.fullmatch("(?P<k>[0-9]+)w(?:eeks)?", command)
-
-        if command == "all":
-            title, txt = reports.write_report_span(df, None, None)
-            renderer.printAndCopy(txt, title=title)
-            todo(todos)
-
-        elif command == "pending":
-            df = df[df.Update.str.contains(re.escape("(!)"))]
-            title, txt = reports.write_report_span(df, None, None)
-            renderer.printAndCopy(txt, title=title)
-
-        elif command == "pending":
-            title, txt = reports.write_report_span(df, None, None)
-            renderer.printAndCopy(txt, title=title)
-
-        elif command == "thisweek":
-            title, txt = reports.report_this_week(df, _now)
-            renderer.printAndCopy(txt, title=title)
-            todo(todos)
-
-        elif (command == "lastweek") or (command == "week") or (command == "w"):
-            title, txt = reports.report_last_week(df, _now)
-            renderer.printAndCopy(txt, title=title)
-            todo(todos)
-
-        elif m_k:
-            k = int(m_k.groupdict()["k"])
-            title, txt = reports.report_last_week(df, _now, weeks=k)
-            renderer.printAndCopy(txt, title=title)
-            todo(todos)
-
-        elif (command == "yesterday") or (command == "y"):
-            title, txt = reports.report_last_day(df, _now)
-            renderer.printAndCopy(txt, title=title)
-            todo(todos)
-
-        elif (command == "today"):
-            title, txt = reports.report_today(df, _now)
-            renderer.printAndCopy(txt, title=title)
-            todo(todos)
-
-        elif command == "span":
-            startdate = datetime.strptime(args["commands"][i + 1], '%Y-%m-%d')
-            enddate = datetime.strptime(args["commands"][i + 2], '%Y-%m-%d')
-            title, txt = reports.write_report_span(df, startdate, enddate)
-            renderer.printAndCopy(txt, title=title)
-            todo(todos)
-            args_to_skip += 2
-
-        elif (command == "open") or (command == "o"):
-            renderer.printAndCopy(reports.report_completion_tasks(df, None), "OPEN TASKS")
-            todo(todos)
-
-        elif command == "standby":
-            renderer.printAndCopy(reports.report_completion_tasks(df, "STANDBY"), "STANDBY TASKS")
-            todo(todos)
-
-        elif command == "closed":
-            renderer.printAndCopy(reports.report_completion_tasks(df, "DONE"), "CLOSED TASKS")
-
-        elif command == "tasks":
-            renderer.printAndCopy(reports.report_tasks(df, postfixes, _now), "TASKS")
-
-        elif command == "tasks_recent" or command=="tr":
-            renderer.printAndCopy(reports.report_tasks(df, postfixes, _now, 10), "TASKS")
-
-        elif command == "todo":
-            renderer.printAndCopy("\n".join(todos), "TODO")
-
-        else:
-            print(
-                f"UNKNOWN COMMAND [{command}]. DEFINED COMMANDS: {', '.join(commands_list)}"
-            )
+        data = data.filter_substring(args['filter'])
+        print(f"FILTERING BY search string [{args['filter']}] ({len(data)}  rows)")
 
+    planner.run_plan(plan, data, todos, postfixes, _now, args["output_dir"], engine, args["limit"])
+    clipboard.flush()
 
 if __name__ == "__main__":
     main()
@@ -1,16 +1,24 @@
 # == RENDERER ===========================================================================================
+import os
 import re
-import subprocess
+import sys
+from functools import lru_cache
 
+import clipboard
+import reporttree
 import utils
-from reports import BULLET, BULLET2
+from reportlines import BULLET, BULLET2
 
 BULLET_MARKDOWN = "* "
 BULLET_MARKDOWN_SLACK = "- "
 
 class Renderer_md():
+    '''
+    Renders a report (title and text) as chunks of text: head(title), then txt(line) of each line of the text, then
+    tail(). The text can then be written as it is produced (see printAndCopy).
+    '''
+
     def __init__(self, markdown_type="slack"):
-        self.buffer = ""
         self.markdown_type = markdown_type
 
         # Markdown flavours setup:
@@ -26,13 +34,13 @@ class Renderer_md():
             return "**" + str + "**"
 
     def title(self, str):
-        self.buffer += self.boldit(str) + "\n"
+        return self.boldit(str) + "\n"
 
     def start(self):
-        pass
+        return ""
 
     def end(self):
-        pass
+        return ""
 
     def replace_bullet(self, str):
         # HACK, render lists instead
@@ -49,26 +57,42 @@ class Renderer_md():
         return update
 
     def txt(self, str):
-        str = self.replace_bullet(str)
-        self.buffer += str + "\n"
+        return self.replace_bullet(str)
 
-    def flush(self, display=True):
-        ret = self.buffer
-        self.buffer = ""
-        if display:
-            print(ret)
-        return ret
+    def head(self, title):
+        return self.start() + (self.title(title) if title else "")
+
+    def tail(self):
+        return "\n" + self.end()
+
+    def iter_render(self, title, lines):
+        '''
+        :param lines: the text, or an iterable of its lines
+        :return: iterator of the rendered chunks, produced as lines are consumed
+        '''
+        yield self.head(title)
+        for line in [lines] if isinstance(lines, str) else lines:
+            yield self.txt(line)
+        yield self.tail()
 
     def render(self, title, body, display=True):
-        self.start()
-        if title:
-            self.title(title)
-        self.txt(body)
-        self.end()
-        txt = self.flush(display)
+        txt = "".join(self.iter_render(title, body))
+        if display:
+            print(txt)
         return txt
 
 
+@lru_cache(maxsize=None)
+def terminal_cols():
+    '''
+    :return: width of the terminal (of stdin, like stty size), 80 if there is none. Probed once per process.
+    '''
+    try:
+        return os.get_terminal_size(sys.stdin.fileno()).columns
+    except (AttributeError, ValueError, OSError):
+        return 80
+
+
 class Renderer_console(Renderer_md):
     bold_str = "\033[1m"
     end_str = "\033[0m"
@@ -77,22 +101,16 @@ class Renderer_console(Renderer_md):
 
     def __init__(self):
         super().__init__()
-        terminal_cols = 80
-        try:
-            _, terminal_cols = subprocess.check_output(["stty", "size"]).decode().split()
-        except:
-            pass
-        headline1 = "_" * int(terminal_cols)
-        Renderer_console.headline1 = self.boldit(headline1)
+        Renderer_console.headline1 = self.boldit("_" * terminal_cols())
 
     def boldit(self, str):
         return f"{Renderer_console.bold_str}{str}{Renderer_console.end_str}"
 
     def start(self):
-        self.buffer += "\n" + Renderer_console.headline1 + "\n\n"
+        return "\n" + Renderer_console.headline1 + "\n\n"
 
     def end(self):
-        self.buffer += Renderer_console.headline1 + "\n"
+        return Renderer_console.headline1 + "\n"
 
     def replace_bullet(self, str):
         # HACK, render lists instead
@@ -105,33 +123,71 @@ class Renderer_console_plain(Renderer_md):
     def txt(self, str):
         str = str.replace(Renderer_console.bold_str, "")
         str = str.replace(Renderer_console.end_str, "")
-        super().txt(str)
+        return super().txt(str)
 
 
 def write_to_clipboard(string):
-    process = subprocess.Popen(
-        'pbcopy', env={'LANG': 'en_US.UTF-8'}, stdin=subprocess.PIPE)
-    process.communicate(string.encode('utf-8'))
-
-
-def printAndCopy(string, title=None):
-    # r = Renderer_md()
-    # md = r.render(title, string, display=False)
-
+    clipboard.copy(string)
+
+
+def head(lines, limit=None):
+    '''
+    :param lines: a text, or an iterable of its lines (each ending with "\n")
+    :param limit: maximum number of lines, None for all of them
+    :return: iterator of the lines, the first limit ones followed by "...\n" if there were more (the others are not
+    consumed)
+    '''
+    if isinstance(lines, str):
+        lines = lines.splitlines(keepends=True)
+    for i, line in enumerate(lines):
+        if limit is not None and i >= limit:
+            yield "...\n"
+            return
+        yield line
+
+
+def printAndCopy(lines, title=None, limit=None, out=None):
+    '''
+    Writes the report to out (stdout by default) line by line as lines produces them, and copies it to the clipboard
+    (without console formatting) once written.
+    :param lines: the text of the report, or an iterable of its lines (e.g. reporttree.iter_reporttree)
+    :param limit: only the first limit lines of the report (see head)
+    '''
+    out = sys.stdout if out is None else out
     r = Renderer_console()
-    r.render(title, string)
-
     r2 = Renderer_console_plain()
-    txt = r2.render(title, string, display=False)
-    write_to_clipboard(txt)
+    out.write(r.head(title))
+    copy = [r2.head(title)]
+    for line in head(lines, limit):
+        out.write(r.txt(line))
+        copy.append(r2.txt(line))
+    out.write(r.tail() + "\n")
+    copy.append(r2.tail())
+    write_to_clipboard("".join(copy))
 
 
-def printAndCopy_tree(tree, updates, title=None):
-    r = Renderer_console()
-    txt = r.render_reporttree(tree, updates)
-    r.render(title, txt)
+def printAndCopy_tree(tree, updates, title=None, limit=None):
+    printAndCopy(reporttree.iter_reporttree(tree, updates, BULLET, BULLET2), title, limit)
+
 
+def printAndCopy_all(titled_strings, limit=None):
+    '''
+    Prints each (title, string) and copies all of them at once.
+    '''
+    r = Renderer_console()
     r2 = Renderer_console_plain()
-    txt = r.render_reporttree(tree, updates)
-    txt = r2.render(title, txt, display=False)
-    write_to_clipboard(txt)
+    copy = []
+    for title, string in titled_strings:
+        string = "".join(head(string, limit))
+        r.render(title, string)
+        copy.append(r2.render(title, string, display=False))
+    write_to_clipboard("".join(copy))
+
+
+def save(lines, filename, title=None):
+    '''
+    Writes the report (see printAndCopy) to filename, without console formatting.
+    '''
+    r = Renderer_console_plain()
+    with open(filename, "w") as file:
+        file.writelines(r.iter_render(title, lines))
@@ -0,0 +1,63 @@
+"""
+Report line formatting, shared by the report engines (reports and lite).
+"""
+from parsing import task_join_external, task_split_internal
+from utils import date_string
+
+BULLET = "  _*_ "
+BULLET2 = "  _o_ "
+
+
+def bold(txt):
+    return '\033[1m' + txt+'\033[0m'
+
+
+def task_display(task, url=None):
+    task = task_join_external(task_split_internal(task))
+    if url and len(url) > 0:
+        task = f"[{task}]({url})"
+    return task
+
+
+def format_key(key, display_key=True):
+    if not display_key:
+        return ""
+    key = f"[{key}]" if isinstance(key, str) and key else " "  # (missing keys are NaN in pandas, None in lite)
+    return f"{key:7}"
+
+
+def format_task(task, url=None):
+    return f"{bold(task_display(task, url)):30}\t" if task else ""
+
+
+def format_date(date):
+    if not date:
+        return ""
+    ds = '(' + date_string(date) + ')'
+    return f" {ds:s}"
+
+
+def format_done(done, display_done=False):
+    return "" if not display_done else " (DONE)" if isinstance(done, str) else " (...)"
+
+
+def line_prefix(level):
+    return "  " * (level + 1) + BULLET
+
+
+def format_line(
+        key,
+        task,
+        update="",
+        done=False,
+        date=None,
+        level=0,
+        display_key=True,
+        display_done=False,
+        url=None
+):
+    update = f": {update}" if update else ""
+    l = f"{line_prefix(level)}{format_key(key, display_key)}{format_task(task, url)}{update}" \
+        f"{format_done(done, display_done)}{format_date(date)}\n"
+
+    return l
@@ -1,62 +1,48 @@
 import calendar
-from collections import defaultdict
 from datetime import timedelta
 
+import numpy as np
+import pandas as pd
+
 import reporttree
+from dataset import as_dataset
 from parsing import *
-from reporttree import tree
-from utils import date_string
-
-# ------------------------------------------------------------------------------------------------------------
-# GOBAL RENDER # todo, move lists to renderer
-# ------------------------------------------------------------------------------------------------------------
-BULLET = "  _*_ "
-BULLET2 = "  _o_ "
-def bold(txt):
-    return '\033[1m' + txt+'\033[0m'
-
-# ------------------------------------------------------------------------------------------------------------
-# REPORT FORMATTING:
-# ------------------------------------------------------------------------------------------------------------
-
-def task_display(task, url=None):
-    task = task_join_external(task_split_internal(task))
-    if url and len(url) > 0:
-        task = f"[{task}]({url})"
-    return task
+from reportlines import *
+from utils import last_day, last_week_span, this_week_span, week_datestr
 
 
 # ------------------------------------------------------------------------------------------------------------
 # REPORT FORMATTING:
 # ------------------------------------------------------------------------------------------------------------
 
-def format_line(
-        key,
-        task,
-        update="",
-        done=False,
-        date=None,
-        level=0,
-        display_key=True,
-        display_done=False,
-        url=None
-):
+def map_distinct(func, values, *columns):
+    '''
+    :return: object array of func(value, *column values) for each of values, calling func once per distinct value (with
+    the column values of its first row)
+    '''
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    first = np.unique(codes, return_index=True)[1]
+    args = [list(uniques)] + [np.asarray(column, dtype=object)[first] for column in columns]
+    mapped = np.empty(len(uniques), dtype=object)
+    mapped[:] = [func(*arg) for arg in zip(*args)]
+    return mapped[codes]
+
+
+def format_lines(df, level=0, display_key=True, display_done=False, display_date=False):
+    '''
+    :return: object array with the format_line of each update row of df
+    '''
+    updates = df.Update.to_numpy(dtype=object)
+    lines = np.full(len(df), line_prefix(level), dtype=object)
     if display_key:
-        key = f"[{key}]" if key else " "
-        key = f"{key:7}"
-    else:
-        key = ""
-    task = f"{bold(task_display(task, url)):30}\t" if task else ""
-    ds = ''
-    if date:
-        ds = '(' + date_string(date) + ')'
-        ds = f" {ds:s}"
-    update = f": {update}" if update else ""
-    prefx = "  " * (level + 1) + BULLET
-    done = "" if not display_done else " (DONE)" if done else " (...)"
-    l = f"{prefx}{key}{task}{update}{done}{ds}\n"
-
-    return l
+        lines += map_distinct(format_key, df.Key)
+    lines += map_distinct(format_task, df.Task, df.URL)
+    lines += np.where(df.Update.str.len().to_numpy() > 0, ": " + updates, "")
+    if display_done:
+        lines += map_distinct(lambda done: format_done(done, True), df.Done)
+    if display_date:
+        lines += map_distinct(format_date, df.Date)
+    return lines + "\n"
 
 
 def report1(
@@ -70,33 +56,22 @@ def report1(
         ascending=False,
         display_group_headers=True
 ):
-    ret = ""
     if last_only:
-        df = df.sort_values("Date").groupby(last_only).tail(1)
+        df = df.sort_values("Date", kind="stable").groupby(last_only, observed=True).tail(1)
     df = df.sort_values(sortby, ascending=ascending)
-    df = df.groupby(groupby, sort=False)
-
-    for name, group in df:
-        tmp = ""
-        nrows = 0
-        for index, row in group.iterrows():
-            tmp += format_line(
-                row.Key,
-                row.Task,
-                row.Update,
-                date=row.Date if display_date else None,
-                done=row.Done,
-                level=1,
-                display_key=display_key,
-                display_done=display_done,
-                url=row.URL
-            )
-            nrows += 1
-
-        if display_group_headers and nrows > 1:
-            ret += BULLET + str(name) + "\n" + tmp
-        else:
-            ret += tmp
+
+    # groups in order of first appearance (as groupby(sort=False)), rows with no group are dropped:
+    codes, names = pd.factorize(df[groupby])
+    rows = np.flatnonzero(codes >= 0)
+    rows = rows[np.argsort(codes[rows], kind="stable")]
+    lines = format_lines(df, level=1, display_key=display_key, display_done=display_done,
+                         display_date=display_date)[rows]
+    if display_group_headers and len(rows):
+        sizes = np.bincount(codes[rows])
+        starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+        for group in np.flatnonzero(sizes > 1):
+            lines[starts[group]] = BULLET + str(names[group]) + "\n" + lines[starts[group]]
+    ret = "".join(lines)
 
     return ret
 
@@ -105,104 +80,152 @@ def report1(
 # REPORTS:
 # ------------------------------------------------------------------------------------------------------------
 
-def report_tasks_at_state(df, postfixes, state, today, most_recent=False):
-    df = completion_tasks(df, state, today, most_recent)
-    df = df[["Task", "Key", "Order"]]
-    df = df.drop_duplicates().sort_values("Order")
+def report_tasks_at_state(data, postfixes, state, today, most_recent=False):
+    data = as_dataset(data)
+    df = data.df.iloc[data.at_state(state, today, most_recent).sort_index().Row.to_numpy(dtype="int64")]
     ret = ""
-    for index, row in df.iterrows():
-        k = f"[{row.Key}]" if row.Key else ""
+    for row in df.itertuples():
+        k = f"[{row.Key}]" if isinstance(row.Key, str) else ""
         k = f"{k:10s}"
         postfixes = f"POSTFIX '{postfixes[row.Task]}'" if row.Task in postfixes else ""
         ret += f"{k}\t{row.Task}\n"
     return ret
 
 
-def report_tasks(df, postfixes, today, most_recent=False):
+def report_tasks(data, postfixes, today, most_recent=False):
+    data = as_dataset(data)
     ret = ""
     if most_recent:
-        ret = report_tasks_at_state(df, postfixes, None, today, most_recent)
+        ret = report_tasks_at_state(data, postfixes, None, today, most_recent)
     else:
         states = {"PENDING":"PENDING","OPEN":None,"STANDBY":"STANDBY","CLOSED":"DONE"}
         for state in states:
-            tmp = report_tasks_at_state(df, postfixes, states[state], today, most_recent)
+            tmp = report_tasks_at_state(data, postfixes, states[state], today, most_recent)
             ret += "\n  * "+state+":\n" + tmp
     return ret
 
 
-def report_completion_tasks(df, completion_value=None, today=None):
-    df = completion_tasks(df, completion_value, today)
-    ret = report1(df, groupby="Task", display_date=True, display_key=False, last_only="Task", sortby="Order",
+def report_completion_tasks(data, completion_value=None, today=None):
+    df = completion_tasks(data, completion_value, today)
+    ret = report1(df, groupby="Task", display_date=True, display_key=False, last_only=None, sortby="Order",
                   ascending=True)
     return ret
 
 
-def report_log(df, task):
-    tmp = df[df.Key == task]
-    if len(tmp) > 0:
-        task = tmp.iloc[0].Task
-    df = df[df.Task == task]
-    ret = report1(df, groupby="Date", display_date=True, display_key=False, last_only=None, sortby="Date",
-                  ascending=True, display_group_headers=False)
+def level_stats(stats, level):
+    '''
+    :return: DataFrame of the task stats aggregated by the task path prefix of length level (tasks with a shorter path
+    are left out), in task order
+    '''
+    paths = {task: task_split_internal(task) for task in stats.Task.unique()}
+    stats = stats.assign(
+        Group=stats.Task.map(lambda task: task_join_internal(paths[task][:level]) if len(paths[task]) >= level else None),
+        Open=stats.Done.isnull(),
+        Standby=stats.Done == "STANDBY",
+        Closed=stats.Done == "DONE",
+        Pending=stats.Done == "PENDING",
+        TaskId=stats.index,
+    )
+    groups = stats.dropna(subset=["Group"]).groupby("Group").agg(
+        TaskId=("TaskId", "min"), Tasks=("Task", "size"), Open=("Open", "sum"), Pending=("Pending", "sum"),
+        Standby=("Standby", "sum"), Closed=("Closed", "sum"), Updates=("Updates", "sum"),
+        FirstDate=("FirstDate", "min"), LastDate=("LastDate", "max"), CycleDays=("CycleDays", "mean"),
+        StandbyDays=("StandbyDays", "sum"),
+    )
+    return groups.sort_values("TaskId")
+
+
+def report_stats(data, now):
+    '''
+    :return: per project and per subproject: number of tasks (and how many are open, pending, in standby or closed),
+    number of updates, first and last update, mean cycle time (first update to close) of the closed tasks and total
+    standby time.
+    '''
+    stats = as_dataset(data).task_stats(now)
+    ret = ""
+    for level, name in ((1, "PROJECTS"), (2, "SUBPROJECTS")):
+        groups = level_stats(stats, level)
+        ret += f"\n  * {name}:\n"
+        ret += f"{'':40s} {'TASKS':>6} {'OPEN':>6} {'PEND':>6} {'STBY':>6} {'CLOSED':>6} {'UPDATES':>8} " \
+               f"{'FIRST':>10} {'LAST':>10} {'CYCLE':>7} {'STANDBY':>7}\n"
+        first = groups.FirstDate.dt.strftime("%Y-%m-%d")
+        last = groups.LastDate.dt.strftime("%Y-%m-%d")
+        cycle = groups.CycleDays.map(lambda days: "-" if days != days else f"{days:.0f}d")
+        standby = groups.StandbyDays.map(lambda days: f"{days:.0f}d")
+        for row, first, last, cycle, standby in zip(groups.itertuples(), first, last, cycle, standby):
+            name = task_join_external(task_split_internal(row.Index))
+            ret += f"{name[:40]:40s} {row.Tasks:6d} {row.Open:6d} {row.Pending:6d} {row.Standby:6d} {row.Closed:6d} " \
+                   f"{row.Updates:8d} {first:>10} {last:>10} {cycle:>7} {standby:>7}\n"
     return ret
 
 
-def report_closed_tasks(df):
-    global _now
-
-    df = completion_tasks(df, "DONE", today=_now)
-    ret = report1(df, groupby="Task", display_date=False, display_key=False, last_only="Task", sortby="Order",
-                  ascending=True)
-    report_span()
+def report_log(data, task):
+    '''
+    :param task: task or alias key, its subtasks are included (see TaskTrie.task_ids)
+    '''
+    df = as_dataset(data).filter_task(task).df
+    ret = report1(df, groupby="Date", display_date=True, display_key=False, last_only=None, sortby="Date",
+                  ascending=True, display_group_headers=False)
     return ret
 
 
-def write_report_span(df, startdate, enddate):
-    title, tree, updates = report_span(df, startdate, enddate)
-    txt = reporttree.write_reporttree(tree, updates, BULLET, BULLET2)
-    return title, txt
+def write_report_span(data, startdate, enddate, stream=False):
+    '''
+    :param stream: return the text as an iterator of its lines, written as they are consumed (for all the report
+    functions using write_report_span)
+    '''
+    title, tree, updates = report_span(data, startdate, enddate)
+    lines = reporttree.iter_reporttree(tree, updates, BULLET, BULLET2)
+    return title, lines if stream else "".join(lines)
 
 
-def report_this_week(df, date):
-    startdate = date + timedelta(days=-date.weekday())
-    enddate = startdate + timedelta(days=6)
+def report_this_week(data, date, stream=False):
+    startdate, enddate = this_week_span(date)
     weekno = startdate.isocalendar()[1]
-    datestr = f"{enddate.date().year} / {enddate.date().month} / {startdate.date().day}-{enddate.date().day}"
+    datestr = week_datestr(startdate, enddate)
 
     title = f"This Week #{weekno}: {datestr}"
-    _, txt = write_report_span(df, startdate, enddate)
+    _, txt = write_report_span(data, startdate, enddate, stream)
     return title, txt
 
 
-def report_last_week(df, date, weeks=1):
-    startdate = date + timedelta(days=-date.weekday(), weeks=-weeks)
-    enddate = startdate + timedelta(days=(7 * weeks) - 1)
+def report_last_week(data, date, weeks=1, stream=False):
+    startdate, enddate = last_week_span(date, weeks)
     weekno = startdate.isocalendar()[1]
-    datestr = f"{enddate.date().year} / {enddate.date().month} / {startdate.date().day}-{enddate.date().day}"
+    datestr = week_datestr(startdate, enddate)
 
     if weeks == 1:
         title = f"Last Week #{weekno}: {datestr}"
     else:
         title = f"Last {weeks} Weeks: {datestr}"
-    _, txt = write_report_span(df, startdate, enddate)
+    _, txt = write_report_span(data, startdate, enddate, stream)
     return title, txt
 
 
-def report_today(df, date):
+def report_weeks(data, startdate, enddate):
+    '''
+    :return: [(monday, title, txt)] report of each week from the one of startdate to the one of enddate
+    '''
+    data = as_dataset(data)
+    ret = []
+    for monday, df in data.weeks(startdate, enddate):
+        title = f"Week #{monday.isocalendar()[1]}: {week_datestr(monday, monday + timedelta(days=6))}"
+        tree, updates = _report(data, df)
+        ret.append((monday, title, reporttree.write_reporttree(tree, updates, BULLET, BULLET2)))
+    return ret
+
+
+def report_today(data, date, stream=False):
     title = f"Today {date.date().isoformat()}:"
-    _, txt = write_report_span(df, date, date)
+    _, txt = write_report_span(data, date, date, stream)
     return title, txt
 
 
-def report_last_day(df, date):
-    weekday = date.weekday()
-    if weekday > 0:
-        startdate = date + timedelta(days=-1)
-    else:
-        startdate = date + timedelta(days=-3)
+def report_last_day(data, date, stream=False):
+    startdate = last_day(date)
     title = calendar.day_name[startdate.weekday()]
     title = f"{title} {startdate.date().isoformat()}:"
-    _, txt = write_report_span(df, startdate, startdate)
+    _, txt = write_report_span(data, startdate, startdate, stream)
     return title, txt
 
 
@@ -212,43 +235,26 @@ def show_url(url):
     return f" ([link]({url}))"
 
 
-def report_span(df, startdate, enddate):
+def report_span(data, startdate, enddate):
     if startdate == None and enddate == None:
         title = "SPAN: All"
-
     elif startdate == None:
-        df = df[df.Date <= str(enddate.date())]
         title = f"SPAN: <= {enddate:%Y-%m-%d}\n\n"
-
     elif enddate == None:
-        df = df[df.Date >= str(startdate.date())]
         title = f"SPAN: >= {startdate:%Y-%m-%d}\n\n"
     else:
-        df = df[(df.Date >= str(startdate.date())) & (df.Date <= str(enddate.date()))]
         title = f"SPAN: {startdate:%Y-%m-%d} - {enddate:%Y-%m-%d}\n\n"
-
-    tree, updates = _report(df)
+    data = as_dataset(data)
+    tree, updates = _report(data, data.by_task(startdate, enddate))
     return title, tree, updates
 
 
-def done(bool):
-    return "  ✓" if bool else ""
-
-
-def _report(df):
-    tasktree = tree()
-    updates = defaultdict(list)
-    df = df.sort_values(["Order", "Task", "URL"])
-    for r in df.itertuples():
-        task_path = task_split_internal(r.Task)
-        p = tasktree
-        for t in task_path:
-            if t not in p:
-                p[t] = tree()
-            p = p[t]
-        p["_key"] = r.Task
-        updates[r.Task].append(r.Update + done(r.Done))
-    return tasktree, updates
+def _report(data, df):
+    '''
+    :param df: updates of data sorted by TaskId (which is Order, Task, URL order)
+    :return: their report tree, built on the task trie of data (see reporttree.span_tree)
+    '''
+    return reporttree.span_tree(data.task_trie(), zip(df.TaskId.tolist(), df.Update, df.Done))
 
 
 # ------------------------------------------------------------------------------------------------------------
@@ -256,27 +262,9 @@ def _report(df):
 # ------------------------------------------------------------------------------------------------------------
 
 
-def start_dates(data):
-    df = data
-    df = df.sort_values(by=["Date"]).groupby(["Task"]).head(1)
-    return df
-
-
-def end_dates(data):
-    global _now
-    return completion_tasks(data, "DONE", today=_now)
-
-
 def completion_tasks(data, completion_value, today=None, most_recent=False):
-    df = data
-    if today:
-        df = df[(df.Date <= today)]
-    df = df.sort_values(by=["Date"]).groupby(["Task"]).tail(1)
-    if completion_value is None:
-        df = df[df.Done.isnull()]
-    else:
-        df = df[(df.Done == completion_value)]
-    df = df.sort_values("Date", ascending=False)
-    if most_recent:
-        df = df.head(most_recent)
-    return df
\ No newline at end of file
+    '''
+    :param data: updates DataFrame or Dataset (whose latest state index is then reused)
+    :return: last update of each task whose state is completion_value (None: open), most recent first
+    '''
+    return as_dataset(data).completion_tasks(completion_value, today, most_recent)
\ No newline at end of file
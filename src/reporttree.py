@@ -1,17 +1,92 @@
-import re
-from collections import defaultdict
+from functools import lru_cache
 
 import parsing
 import utils
+from tasktrie import TaskTrie
 from utils import tab
 
 
-def tree():
-    """The report task structure tree. Each level contains a _key value with the full string path as well as any
-    subtasks. Updates are stores separtedly"""
-    return defaultdict(tree)
+def done(state):
+    return "  ✓" if isinstance(state, str) else ""
 
 
+class ReportTree:
+    '''
+    Tree of the tasks of a report (see span_tree), as lists over its nodes: the root is node 0, the others follow in
+    the order they were added. Node i shows the node nodes[i] of trie, with the updates updates[first[i]:last[i]], and
+    its children in report order are child[i] and then their next siblings (-1 if none). They hold no other objects
+    than ints, which the garbage collector does not track.
+    '''
+    __slots__ = ("trie", "nodes", "first", "last", "child", "sibling")
+
+    def __init__(self, trie):
+        self.trie = trie
+        self.nodes, self.first, self.last, self.child, self.sibling = [0], [0], [0], [-1], [-1]
+
+
+def span_tree(trie, rows):
+    '''
+    Builds the report tree of the tasks of a report, and of their parent tasks, on trie (a tasktrie.TaskTrie). Each
+    report has a tree of its own: the reports of a trie can be written in any order, also interleaved.
+    :param rows: (TaskId, update, done state) of the updates of the report, sorted by TaskId
+    :return: (ReportTree, updates of the report), see write_reporttree
+    '''
+    tree = ReportTree(trie)
+    nodes, first, last, child, sibling = tree.nodes, tree.first, tree.last, tree.child, tree.sibling
+    tail = [-1]  # last child of each node
+    mark, parents = trie.mark, trie.parents
+    mark[0] = 0  # (a node of trie is node mark[node] of this tree if nodes[mark[node]] == node)
+    updates = []
+    i, last_id = -1, None
+    for task_id, update, state in rows:
+        if task_id != last_id:
+            if i >= 0:
+                last[i] = len(updates)
+            node, last_id = trie.nodes[task_id], task_id
+            path = []
+            parent = mark[node]
+            while not (0 <= parent < len(nodes) and nodes[parent] == node):
+                path.append(node)
+                node = parents[node]
+                parent = mark[node]
+            for node in reversed(path):
+                mark[node] = i = len(nodes)
+                nodes.append(node)
+                first.append(0)
+                last.append(0)
+                child.append(-1)
+                sibling.append(-1)
+                tail.append(-1)
+                if tail[parent] < 0:
+                    child[parent] = i
+                else:
+                    sibling[tail[parent]] = i
+                tail[parent] = parent = i
+            i = mark[trie.nodes[task_id]]
+            first[i] = len(updates)
+        updates.append(update + done(state))
+    if i >= 0:
+        last[i] = len(updates)
+    return tree, updates
+
+
+def task_tree(rows):
+    '''
+    :param rows: (task, update, done state) of the updates, in report order
+    :return: (tree of the tasks, their updates) as span_tree, on a trie of these tasks
+    '''
+    task_ids = {}
+    by_task = []
+    for task, update, state in rows:
+        task_id = task_ids.setdefault(task, len(task_ids))
+        if task_id == len(by_task):
+            by_task.append([])
+        by_task[task_id].append((task_id, update, state))
+    trie = TaskTrie(((task_id, task, None) for task, task_id in task_ids.items()), [])
+    return span_tree(trie, (row for task_rows in by_task for row in task_rows))
+
+
+@lru_cache(maxsize=4096)
 def format_task(str):
     bold_str = "\033[1m"
     end_str = "\033[0m"
@@ -21,41 +96,61 @@ def format_task(str):
 
 
 def format_update(update):
-    if not re.match("[.!?]", update[-1]):
+    if update[-1] not in ".!?":
         update += "."
     return utils.upper_first(update)
 
 
 def depth_first_report(tree, updates, bullet1, bullet2, depth=0):
-    ret = ""
-    if "_key" in tree:
-        key = tree["_key"]
-        h = f"{tab(depth)}{bullet2}"
-        ret += h + ("\n" + h).join([format_update(x) for x in updates[key]]) + "\n"
-
-    for k, v in tree.items():
-        if k == "_key":  # dont render
+    '''
+    :return: iterator of the report lines of tree (a ReportTree), walked as they are consumed
+    '''
+    trie, nodes, first, last, child, sibling = tree.trie, tree.nodes, tree.first, tree.last, tree.child, tree.sibling
+    h = f"{tab(depth)}{bullet2}"
+    for update in updates[first[0]:last[0]]:
+        yield h + format_update(update) + "\n"
+    stack = [child[0]]  # next node to visit at each depth (-1 if none)
+    while stack:
+        i = stack[-1]
+        if i < 0:
+            stack.pop()
             continue
-        ret += f"{tab(depth)}{bullet1}{format_task(k)}:\n" + depth_first_report(v, updates, bullet1, bullet2, depth + 1)
-    return ret
+        stack[-1] = sibling[i]
+        d = depth + len(stack) - 1
+        yield f"{tab(d)}{bullet1}{format_task(trie.name(nodes[i]))}:\n"
+        h = f"{tab(d + 1)}{bullet2}"
+        for update in updates[first[i]:last[i]]:
+            yield h + format_update(update) + "\n"
+        stack.append(child[i])
 
 
 def depth_first_report_flat(tree, updates, bullet):
-    ret = ""
-    if "_key" in tree and tree["_key"] in updates:
-        key = tree["_key"]
-        h = f"{bullet}{format_task(key)}: "
-        ret += h + ("\n" + h).join([format_update(x) for x in updates[key]]) + "\n"
-    for k, v in tree.items():
-        if k == "_key":
+    '''
+    :return: iterator of the report lines of tree (a ReportTree), walked as they are consumed
+    '''
+    trie, nodes, first, last, child, sibling = tree.trie, tree.nodes, tree.first, tree.last, tree.child, tree.sibling
+    stack = [0]  # next node to visit at each depth (-1 if none)
+    while stack:
+        i = stack[-1]
+        if i < 0:
+            stack.pop()
             continue
-        ret += depth_first_report_flat(v, updates, bullet)
-    return ret
+        stack[-1] = sibling[i]
+        if last[i] > first[i]:
+            h = f"{bullet}{format_task(trie.tasks[nodes[i]])}: "
+            for update in updates[first[i]:last[i]]:
+                yield h + format_update(update) + "\n"
+        stack.append(child[i])
 
 
-def write_reporttree(tasktree, updates, BULLET, BULLET2, oldformat=False):
+def iter_reporttree(tasktree, updates, BULLET, BULLET2, oldformat=False):
+    '''
+    :return: iterator of the lines of write_reporttree, each ending with "\n"
+    '''
     if oldformat:
-        txt = depth_first_report_flat(tasktree, updates, BULLET)
-    else:
-        txt = depth_first_report(tasktree, updates, BULLET, BULLET2)
-    return txt
+        return depth_first_report_flat(tasktree, updates, BULLET)
+    return depth_first_report(tasktree, updates, BULLET, BULLET2)
+
+
+def write_reporttree(tasktree, updates, BULLET, BULLET2, oldformat=False):
+    return "".join(iter_reporttree(tasktree, updates, BULLET, BULLET2, oldformat))
@@ -0,0 +1,94 @@
+"""
+Full-text search of the updates (--search): an inverted index from the words of the update texts and task paths to
+the rows of the updates table, queried with AND/OR of words and word prefixes.
+"""
+import re
+from bisect import bisect_left
+
+token_rex = re.compile(r"\w+")
+
+
+def tokens(text):
+    '''
+    :return: the lowercase words of text, in order of first appearance
+    '''
+    return tuple(dict.fromkeys(token_rex.findall(text.lower())))
+
+
+def parse_query(query):
+    '''
+    Query syntax: terms separated by spaces must all match (AND), OR (or |) separates alternatives, and a term ending
+    with * matches any word with that prefix. E.g. "legal contract* OR lawyer".
+    :return: list of alternatives, each a list of (word, is_prefix) that must all match
+    '''
+    alternatives = [[]]
+    for term in query.split():
+        if term in ("OR", "|"):
+            alternatives.append([])
+            continue
+        words = tokens(term)
+        alternatives[-1] += [(word, term.endswith("*") and i == len(words) - 1) for i, word in enumerate(words)]
+    return [terms for terms in alternatives if terms]
+
+
+class InvertedIndex:
+    '''
+    Rows (positions in the updates table) of each word of the update texts and task paths.
+    '''
+
+    def __init__(self, updates, tasks, text_tokens=None):
+        '''
+        :param updates: Update column of the updates table
+        :param tasks: Task column of the updates table
+        :param text_tokens: text_tokens of a previous index of the same files, so that only new texts are tokenized
+        '''
+        previous = text_tokens or {}
+        self.text_tokens = {}  # {text: tokens(text)} of the update texts and tasks
+
+        def text_words(text):
+            words = self.text_tokens.get(text)
+            if words is None:
+                words = self.text_tokens[text] = previous.get(text) or tokens(text)
+            return words
+
+        postings = {}
+        n_rows = 0
+        for row, (update, task) in enumerate(zip(updates, tasks)):
+            n_rows += 1
+            for word in text_words(update) + text_words(task):
+                rows = postings.get(word)
+                if rows is None:
+                    postings[word] = [row]
+                elif rows[-1] != row:
+                    rows.append(row)
+        self.postings = postings
+        self.n_rows = n_rows
+        self.words = sorted(postings)
+
+    def word_rows(self, word, is_prefix=False):
+        '''
+        :return: set of the rows containing word (a word starting with word if is_prefix)
+        '''
+        if not is_prefix:
+            return set(self.postings.get(word, ()))
+        rows = set()
+        for i in range(bisect_left(self.words, word), len(self.words)):
+            if not self.words[i].startswith(word):
+                break
+            rows.update(self.postings[self.words[i]])
+        return rows
+
+    def search(self, query):
+        '''
+        :param query: see parse_query
+        :return: sorted rows matching query
+        '''
+        matches = set()
+        for terms in parse_query(query):
+            rows = None
+            for word, is_prefix in sorted(terms, key=lambda term: len(self.postings.get(term[0], ()))):
+                rows = self.word_rows(word, is_prefix) if rows is None else rows & self.word_rows(word, is_prefix)
+                if not rows:
+                    break
+            matches |= rows
+        return sorted(matches)
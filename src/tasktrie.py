@@ -0,0 +1,122 @@
+"""
+Trie of the task paths, to find the updates of a task and all its subtasks (--task) without scanning the updates.
+"""
+from array import array
+from itertools import accumulate, chain
+
+from parsing import task_split_internal, task_targets
+
+
+class TaskTrie:
+    '''
+    Trie of the task paths ("::" separated) of an updates table, with the rows of each TaskId and the alias keys of the
+    tasks. Its nodes are numbered (the root is node 0) and stored in flat arrays: node i is named
+    names[name_codes[i]], its parent is parents[i], and it is the task tasks[i] of TaskId ids[i] (None and -1 if it
+    is only the prefix of other tasks). Its children are child[i] and then their next siblings (-1 if none).
+    '''
+
+    def __init__(self, tasks, task_ids):
+        '''
+        :param tasks: (TaskId, Task, Key) of each task, Key being its alias key or None
+        :param task_ids: TaskId column of the updates table (a list)
+        '''
+        self.keys = {}
+        self.nodes = {}  # {TaskId: node}
+        self.names = []  # one string per element name, shared by its nodes
+        self.codes = {}  # {name: its index in names}
+        self.edges = {}  # {code of a name << 32 | node: the child of node of that name}
+        self.tasks = [None]
+        self.name_codes, self.parents, self.ids, self.child, self.sibling, self.mark = (
+            array("i", [-1]) for _ in range(6))  # (mark is set by reporttree.span_tree)
+        for task_id, task, key in tasks:
+            if key is not None:
+                self.keys[key] = task
+            node = 0
+            for name in task_split_internal(task):
+                code = self.codes.setdefault(name, len(self.names))
+                if code == len(self.names):
+                    self.names.append(name)
+                child = self.edges.get(code << 32 | node)
+                if child is None:
+                    child = self.edges[code << 32 | node] = self.add_node(node, code)
+                node = child
+            self.tasks[node], self.ids[node] = task, task_id
+            self.nodes[task_id] = node
+        # rows of the updates sorted by TaskId, those of task_id being rows_by_task[offsets[task_id]:offsets[task_id+1]]
+        self.rows_by_task = array("i", sorted(range(len(task_ids)), key=task_ids.__getitem__))
+        offsets = array("i", [0]) * (max(chain(self.nodes, task_ids), default=-1) + 2)
+        for task_id in task_ids:
+            offsets[task_id + 1] += 1
+        self.offsets = array("i", accumulate(offsets))
+
+    def add_node(self, parent, code):
+        '''
+        :return: the new node, first child of parent, named names[code]
+        '''
+        node = len(self.tasks)
+        self.tasks.append(None)
+        self.name_codes.append(code)
+        self.parents.append(parent)
+        self.ids.append(-1)
+        self.child.append(-1)
+        self.sibling.append(self.child[parent])
+        self.mark.append(-1)
+        self.child[parent] = node
+        return node
+
+    def name(self, node):
+        return self.names[self.name_codes[node]]
+
+    def children(self, node):
+        '''
+        :return: {name: node} of the children of node
+        '''
+        children = {}
+        child = self.child[node]
+        while child >= 0:
+            children[self.name(child)] = child
+            child = self.sibling[child]
+        return children
+
+    def node(self, task):
+        '''
+        :param task: internal task path
+        :return: the node of task, None if there is no such task
+        '''
+        node = 0
+        for name in task_split_internal(task):
+            node = self.edges.get(self.codes.get(name, -1) << 32 | node)
+            if node is None:
+                return None
+        return node
+
+    def task_ids(self, task, aliases=None):
+        '''
+        :param task: see parsing.task_targets
+        :param aliases: {key: task} of the aliases, by default the alias keys of the tasks
+        :return: set of the TaskIds of task and its subtasks
+        '''
+        task_ids = set()
+        nodes = [self.node(target) for target in task_targets(task, self.keys if aliases is None else aliases)]
+        nodes = [node for node in nodes if node is not None]
+        while nodes:
+            node = nodes.pop()
+            if self.ids[node] >= 0:
+                task_ids.add(self.ids[node])
+            child = self.child[node]
+            while child >= 0:
+                nodes.append(child)
+                child = self.sibling[child]
+        return task_ids
+
+    def task_rows(self, task_id):
+        '''
+        :return: the rows of the updates of TaskId task_id, in order
+        '''
+        return self.rows_by_task[self.offsets[task_id]:self.offsets[task_id + 1]]
+
+    def rows(self, task, aliases=None):
+        '''
+        :return: sorted rows of the updates of task and its subtasks (see task_ids)
+        '''
+        return sorted(row for task_id in self.task_ids(task, aliases) for row in self.task_rows(task_id))
@@ -1,14 +1,13 @@
 import subprocess
-from datetime import datetime
+from datetime import datetime, timedelta
 import sys
 
-from dateutil.relativedelta import relativedelta
-
 
 
 def date_string(dt, now=datetime.now()):
     if not dt:
         return ""
+    from dateutil.relativedelta import relativedelta  # (only needed by the reports that show dates)
     rd = relativedelta(now, dt)
     if rd.years or rd.months:
         months = 12 * rd.years + rd.months
@@ -36,3 +35,27 @@ def upper_first(str):
 
 def tab(n):
     return "  "*n
+
+
+def this_week_span(date):
+    startdate = date + timedelta(days=-date.weekday())
+    return startdate, startdate + timedelta(days=6)
+
+
+def last_day(date):
+    '''
+    :return: the previous working day (Friday on Mondays)
+    '''
+    weekday = date.weekday()
+    if weekday > 0:
+        return date + timedelta(days=-1)
+    return date + timedelta(days=-3)
+
+
+def last_week_span(date, weeks=1):
+    startdate = date + timedelta(days=-date.weekday(), weeks=-weeks)
+    return startdate, startdate + timedelta(days=(7 * weeks) - 1)
+
+
+def week_datestr(startdate, enddate):
+    return f"{enddate.date().year} / {enddate.date().month} / {startdate.date().day}-{enddate.date().day}"
@@ -0,0 +1,57 @@
+import pandas as pd
+import pytest
+
+from src import lite, parsing, reports
+
+
+class Engine:
+    '''
+    Report engine under test: reports (pandas) or lite. Tests parse and report through it, and check the update tables
+    of lite as DataFrames (frame).
+    '''
+
+    def __init__(self, name):
+        self.name = name
+        self.reports = lite if name == "lite" else reports
+
+    def parse_file(self, content):
+        return (lite if self.name == "lite" else parsing).parse_file(content)
+
+    def parse_tables(self, content, row_filter=None):
+        if self.name == "lite":
+            return lite.parse_tables(content, row_filter)
+        return parsing.parse_tables(content, row_filter=row_filter)
+
+    def dataset(self, df):
+        return df if self.name == "lite" else reports.as_dataset(df)
+
+    def take(self, df, rows):
+        return df.take(rows) if self.name == "lite" else df.iloc[rows]
+
+    def frame(self, df):
+        '''
+        :return: the updates table df as a DataFrame (missing values as in the pandas engine)
+        '''
+        if self.name != "lite":
+            return df
+        return pd.DataFrame({**df.columns, "Date": pd.to_datetime(df.Date),
+                             "Done": pd.Categorical(df.Done, categories=parsing.DONE_STATES)})
+
+    def task_frame(self, tasks):
+        if self.name != "lite":
+            return tasks
+        return pd.DataFrame(tasks, columns=["Task", "Key", "Order", "URL"])
+
+    def equals(self, df, des):
+        '''
+        :param des: DataFrame, rows of frame(table) for a table of this engine
+        :return: whether the updates table df has the rows of des (lite tables are not indexed or typed like them)
+        '''
+        if self.name != "lite":
+            return df.equals(des)
+        return self.frame(df).astype(str).values.tolist() == des.astype(str).values.tolist()
+
+
+@pytest.fixture(params=["pandas", "lite"])
+def engine(request):
+    return Engine(request.param)
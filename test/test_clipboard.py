@@ -0,0 +1,49 @@
+import pytest
+
+from src import clipboard
+
+
+@pytest.mark.parametrize("commands,env,des_backend", [
+    (["pbcopy", "xclip"], {"DISPLAY": ":0"}, "pbcopy"),
+    (["wl-copy", "xclip"], {"DISPLAY": ":0", "WAYLAND_DISPLAY": "wayland-0"}, "wl-copy"),
+    (["wl-copy", "xclip"], {"DISPLAY": ":0"}, "xclip"),
+    (["xclip"], {"SSH_TTY": "/dev/pts/1"}, "osc52"),
+    (["xclip"], {}, "none"),
+])
+def test_detect(monkeypatch, commands, env, des_backend):
+    monkeypatch.setattr(clipboard.shutil, "which",
+                        lambda command: f"/usr/bin/{command}" if command in commands else None)
+    for var in ["DISPLAY", "WAYLAND_DISPLAY", "SSH_TTY"]:
+        monkeypatch.delenv(var, raising=False)
+    for var, value in env.items():
+        monkeypatch.setenv(var, value)
+    clipboard.detect.cache_clear()
+    try:
+        assert clipboard.backend()[0] == des_backend
+    finally:
+        clipboard.detect.cache_clear()
+
+
+def test_backend_errors(monkeypatch):
+    monkeypatch.setattr(clipboard.shutil, "which", lambda command: None)
+    with pytest.raises(SystemExit):
+        clipboard.backend("xclip")
+    with pytest.raises(SystemExit):
+        clipboard.backend("clipboard")
+    with pytest.raises(SystemExit):
+        clipboard.backend("none:/tmp/x")
+
+
+def test_flush_once(monkeypatch, tmp_path):
+    path = tmp_path / "clipboard.txt"
+    name, write = clipboard.backend(f"file:{path}")
+    writes = []
+    monkeypatch.setattr(clipboard, "_backend", (name, lambda txt: writes.append(txt) or write(txt)))
+    monkeypatch.setattr(clipboard, "_pending", [])
+    assert clipboard.flush() is None
+    clipboard.copy("report 1\n")
+    clipboard.copy("report 2\n")
+    clipboard.flush().join()
+    assert writes == ["report 1\nreport 2\n"]
+    assert path.read_text() == "report 1\nreport 2\n"
+    assert clipboard.flush() is None
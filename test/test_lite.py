@@ -0,0 +1,109 @@
+from datetime import datetime
+
+import pytest
+
+from src import lite, reports
+from src.parsing import RowFilter, parse_tables
+
+FILE_CONTENT = """
+[T1] project:: task1:: https://example.com/t1
+[T2] project:: task2:: POSTFIX<(!)>
+[T3] other:: task3:: POSTFIX<(,)> ORDER<a>
+[T4] other:: task4:: POSTFIX<(DONE)>
+# 2001-01-10
+T1:: update 10 (!)
+task5:: update 10
+T3:: update 10
+# 2001-01-09
+T2:: update 9 (.)
+task5:: update 9 (,)
+T4:: update 9
+# 2001-01-02
+T1:: update 2 (.)
+task5:: update 2
+project:: task6:: update 2
+#TODO todo 2
+"""
+
+NOW = datetime(2001, 1, 10)
+
+
+def ascending(content):
+    blocks = content.split("\n# ")
+    return "\n# ".join(blocks[:1] + blocks[:0:-1])
+
+
+@pytest.fixture(params=[False, True], ids=["descending", "ascending"])
+def tables(request):
+    content = ascending(FILE_CONTENT) if request.param else FILE_CONTENT
+    return parse_tables(content), lite.parse_tables(content)
+
+
+def as_lists(df):
+    return {
+        name: [None if value is None or value != value else value for value in df[name].tolist()]
+        for name in lite.COLUMNS
+    }
+
+
+def test_parse_tables(tables):
+    (df, *rest), (table, *lite_rest) = tables
+    assert as_lists(df) == table.columns
+    assert rest[:-1] == lite_rest[:-1]
+    assert [tuple(None if value != value else value for value in row) for row in rest[-1].itertuples(index=False)] == \
+           lite_rest[-1]
+
+
+def test_row_filter():
+    row_filter = RowFilter(datetime(2001, 1, 9).date(), NOW.date(), "project", None)
+    assert as_lists(parse_tables(FILE_CONTENT, row_filter=row_filter)[0]) == \
+           lite.parse_tables(FILE_CONTENT, row_filter)[0].columns
+
+
+@pytest.mark.parametrize("state", [None, "DONE", "STANDBY", "PENDING"])
+@pytest.mark.parametrize("today", [None, datetime(2001, 1, 9), NOW])
+def test_completion_tasks(tables, state, today):
+    (df, *_), (table, *_) = tables
+    assert as_lists(reports.completion_tasks(df, state, today)) == lite.completion_tasks(table, state, today).columns
+    assert reports.report_completion_tasks(df, state, today) == lite.report_completion_tasks(table, state, today)
+
+
+@pytest.mark.parametrize("name,args", [
+    ("write_report_span", (None, None)),
+    ("write_report_span", (datetime(2001, 1, 9), NOW)),
+    ("report_today", (NOW,)),
+    ("report_last_day", (NOW,)),
+    ("report_this_week", (NOW,)),
+    ("report_last_week", (datetime(2001, 1, 16), 2)),
+])
+def test_span_reports(tables, name, args):
+    (df, *_), (table, *_) = tables
+    assert getattr(reports, name)(df, *args) == getattr(lite, name)(table, *args)
+    assert reports.write_report_span(reports.as_dataset(df).pending(), None, None) == \
+           lite.write_report_span(table.pending(), None, None)
+
+
+@pytest.mark.parametrize("most_recent", [False, 2])
+def test_report_tasks(tables, most_recent):
+    (df, _, postfixes, *_), (table, *_) = tables
+    assert reports.report_tasks(df, postfixes, NOW, most_recent) == lite.report_tasks(table, postfixes, NOW, most_recent)
+
+
+@pytest.mark.parametrize("kwargs", [
+    dict(groupby="Task"),
+    dict(groupby="Date", display_date=True, display_done=True, sortby="Order", ascending=True),
+    dict(groupby="Key", last_only="Task", display_group_headers=False),
+    dict(groupby="Task", last_only="Key", sortby="Order", ascending=True),
+])
+def test_report1(tables, kwargs):
+    (df, *_), (table, *_) = tables
+    assert reports.report1(df, **kwargs) == lite.report1(table, **kwargs)
+
+
+def test_filters(tables):
+    (df, *_), (table, *_) = tables
+    data = reports.as_dataset(df)
+    for task in ["project", "T1", "project / task6", "other::task3", "task"]:
+        assert as_lists(data.filter_task(task).df) == table.filter_task(task).columns
+    assert as_lists(data.filter_substring("update 1").df) == table.filter_substring("update 1").columns
+    assert len(data.pending()) == len(table.pending()) == 2
@@ -0,0 +1,208 @@
+import datetime
+import os
+
+import pytest
+
+from src import loader
+
+FILE_CONTENT = """
+[T1] task1:: http://test.com ORDER<z>
+# 2001-01-02
+T1:: update 2
+task2:: update b (.)
+# 2001-01-01
+T1:: update 1
+"""
+
+
+def write(path, content):
+    with open(path, "w") as file:
+        file.write(content)
+    return str(path)
+
+
+def test_snapshot_cache(tmp_path, monkeypatch):
+    filename = write(tmp_path / "updates.txt", FILE_CONTENT)
+    cache_dir = str(tmp_path / "cache")
+
+    df, todos, postfixes, date_ascending, aliases, urls, order, tasks = loader.load([filename], cache_dir)
+    assert df.Task.tolist() == ["task1", "task2", "task1"]
+    assert aliases == {"T1": "task1"}
+    assert urls == {"task1": "http://test.com"}
+    assert order == {"task1": "z"}
+
+    def no_parse(*block):
+        raise AssertionError("snapshot not used")
+
+    # warm start (also after touching the file):
+    monkeypatch.setattr(loader, "parse_block", no_parse)
+    os.utime(filename, ns=(0, 0))
+    df2, _, _, _, aliases2, urls2, order2, tasks2 = loader.load([filename], cache_dir)
+    assert df2.equals(df) and tasks2.equals(tasks)
+    assert (aliases2, urls2, order2) == (aliases, urls, order)
+    monkeypatch.undo()
+
+    # modified file:
+    write(filename, FILE_CONTENT + "task3:: update c\n")
+    df3 = loader.load([filename], cache_dir)[0]
+    assert df3.Task.tolist() == ["task1", "task2", "task1", "task3"]
+
+
+def test_block_cache(monkeypatch):
+    from src import parsing
+
+    content = """[T1] task1::
+### comment block
+# 2001-01-04
+###
+# 2001-01-03
+T1:: update 3
+# 2001-01-02
+task2:: update 2
+# 2001-01-01
+T1:: update 1
+"""
+    block_cache = {}
+    tables = parsing.parse_tables(content, block_cache)
+    assert len(block_cache) == 4
+    assert tables[0].equals(parsing.parse_tables(content)[0])
+
+    parsed = []
+    parse_block = parsing.parse_block
+    monkeypatch.setattr(parsing, "parse_block", lambda *block: parsed.append(block) or parse_block(*block))
+    content = content.replace("task2:: update 2", "task2:: update 2 (.)")
+    df = parsing.parse_tables(content, block_cache)[0]
+    assert [block[0] for block in parsed] == [datetime.date(2001, 1, 2)]
+    assert df.Task.tolist() == ["task1", "task2", "task1"]
+    assert df.Done.tolist()[1] == "DONE"
+    assert len(block_cache) == 4
+
+
+def test_parallel_load(tmp_path):
+    filenames = [
+        write(tmp_path / "u3.txt", "[T1] task1::\n# 2001-01-03\nT1:: update 3\n"),
+        write(tmp_path / "u2.txt", "# 2001-01-02\ntask2:: update 2 (.)\nT1:: update 2\n"),
+        write(tmp_path / "u1.txt", "# 2001-01-01\nT1:: update 1\n"),
+    ]
+    df = loader.load(filenames, jobs=1)[0]
+    assert df.Task.tolist() == ["task1", "task2", "task1", "task1"]
+    assert df.equals(loader.load(filenames, jobs=2)[0])
+
+    # date order is checked across files:
+    with pytest.raises(SystemExit, match="u2.txt:1"):
+        loader.load([filenames[0], filenames[2], filenames[1]], jobs=2)
+
+
+WINDOW_CONTENT = """[T1] task1::
+# 2001-01-01
+T1:: update 1
+###
+# 2001-01-02
+commented out:: update
+###
+# 2001-01-03
+T1:: update 3
+task2:: update 3b
+# 2001-01-04
+###
+# 2001-01-05
+commented out:: update
+###
+[T2] task2:: ORDER<a>
+T2:: update 4
+#TODO todo 4
+# 2001-01-06
+T1:: update 6
+"""
+
+WINDOW_CONTENT_DESCENDING = """[T1] task1::
+# 2001-01-06
+T1:: update 6
+# 2001-01-05
+###
+# 2001-01-04
+commented out:: update
+###
+[T2] task2:: ORDER<a>
+T2:: update 4
+#TODO todo 4
+# 2001-01-03
+T1:: update 3
+task2:: update 3b
+# 2001-01-01
+T1:: update 1
+"""
+
+
+@pytest.mark.parametrize(
+    "content,des_tasks",
+    [
+        (WINDOW_CONTENT, ["task1", "task2", "task2"]),
+        (WINDOW_CONTENT_DESCENDING, ["task2", "task1", "task2"]),
+    ],
+)
+def test_load_window(tmp_path, monkeypatch, content, des_tasks):
+    filename = write(tmp_path / "updates.txt", content)
+    monkeypatch.setattr(loader, "SCAN_CHUNK_BYTES", 16)
+
+    full = loader.load([filename])[0]
+    startdate, enddate = datetime.date(2001, 1, 3), datetime.date(2001, 1, 5)
+    df, todos, _, _, aliases, _, order, _ = loader.load_window([filename], startdate, enddate)
+    assert df.Update.tolist() == [u for u in full.Update.tolist() if u in ("update 3", "update 3b", "update 4")]
+    assert df.Task.tolist() == des_tasks
+    assert aliases == {"T1": "task1", "T2": "task2"} and order == {"task2": "a"}
+    assert todos == ["#TODO todo 4"]
+
+    # (the window starts in a comment block)
+    df, _, _, _, aliases, _, _, _ = loader.load_window([filename], datetime.date(2001, 1, 5), datetime.date(2001, 1, 8))
+    assert df.Update.tolist() == full[full.Date >= "2001-01-05"].Update.tolist()
+    assert aliases == {"T1": "task1", "T2": "task2"}
+
+    df = loader.load_window([filename], datetime.date(2001, 1, 7), datetime.date(2001, 1, 8))[0]
+    assert len(df) == 0
+
+
+def test_load_window_errors(tmp_path):
+    filename = write(tmp_path / "updates.txt", WINDOW_CONTENT + "# 2001-01-07\n[bad alias\n")
+    with pytest.raises(SystemExit, match="LINE: 22"):
+        loader.load_window([filename], datetime.date(2001, 1, 7), datetime.date(2001, 1, 7))
+
+
+@pytest.mark.parametrize("padding", [0, 3 * loader.EDGE_BYTES])
+def test_snapshot_same_size_and_mtime(tmp_path, padding):
+    # an edit keeping the size and the mtime (e.g. touch -r) is seen at both ends of the file:
+    content = FILE_CONTENT + "\n" * padding + "task3:: update c\n"
+    filename = write(tmp_path / "updates.txt", content)
+    cache_dir = str(tmp_path / "cache")
+    assert loader.load([filename], cache_dir)[0].Task.tolist() == ["task1", "task2", "task1", "task3"]
+    st = os.stat(filename)
+    for old, new in [("task2", "task4"), ("task3", "task5")]:
+        content = content.replace(old, new)
+        write(filename, content)
+        os.utime(filename, ns=(st.st_atime_ns, st.st_mtime_ns))
+        assert os.stat(filename).st_size == st.st_size
+        df = loader.load([filename], cache_dir)[0]
+        assert new in df.Task.tolist() and old not in df.Task.tolist()
+
+
+def test_load_window_states(tmp_path):
+    # pending marks and alias postfixes outside the window do not apply to the updates in it (unlike load):
+    filename = write(tmp_path / "updates.txt", """
+[T1] task1::
+# 2001-01-01
+T1:: started (!)
+[T3] task3:: POSTFIX<(.)>
+# 2001-01-05
+T1:: update 5
+T3:: update 5
+task2:: update 5 (.)
+# 2001-01-08
+T1:: more
+""")
+    full = loader.load([filename])[0]
+    full = full[full.Date == "2001-01-05"]
+    assert full.Task.tolist() == ["task1", "task3", "task2"]
+    assert full.Done.tolist() == ["PENDING", "DONE", "DONE"]
+    window = loader.load_window([filename], datetime.date(2001, 1, 5), datetime.date(2001, 1, 5))[0]
+    assert window.Task.tolist() == ["task1", "T3", "task2"]
+    assert window.Done.isna().tolist() == [True, True, False]
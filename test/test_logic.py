@@ -1,7 +1,5 @@
 import pytest
 
-from src.parsing import parse_file
-
 @pytest.mark.parametrize(
     "file_content, des_task_order",
     [
@@ -19,8 +17,23 @@ from src.parsing import parse_file
         ),
     ],
 )
-def test_order(file_content, des_task_order):
-    df, todos, posfixes, date_ascending, aliases = parse_file(file_content)
-    df = df.sort_values("Order")
+def test_order(engine, file_content, des_task_order):
+    df, todos, posfixes, date_ascending, aliases = engine.parse_file(file_content)
+    df = engine.frame(df).sort_values("Order")
     tasks = df.Task.tolist()
     assert tasks == des_task_order
+
+
+def test_task_table(engine):
+    df, todos, postfixes, date_ascending, aliases, urls, order, tasks = engine.parse_tables(
+        "# 2001-01-01\n[T1] Task1:: http://t1.com ORDER<z>\nBBBB:: update b\nT1:: update t1\nBBBB:: update b2 (.)"
+    )
+    df, tasks = engine.frame(df), engine.task_frame(tasks)
+    assert tasks.Task.tolist() == ["BBBB", "Task1"]
+    assert tasks.Key.fillna("").tolist() == ["", "T1"]
+    assert tasks.URL.tolist() == ["", "http://t1.com"]
+    assert df.TaskId.tolist() == [0, 1, 0]
+    assert [tasks.Task[task_id] for task_id in df.TaskId] == df.Task.tolist()
+    if engine.name == "pandas":
+        assert (df.Task.cat.codes == df.TaskId).all()
+    assert df.sort_values("TaskId", kind="stable").Update.tolist() == ["update b", "update b2", "update t1"]
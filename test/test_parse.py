@@ -1,8 +1,12 @@
-from datetime import datetime
+import time
+from datetime import date, datetime
+
+import pandas as pd
 import pytest
 
-from src.parsing import task_join_internal, parse_file, parse_line
-from src.reports import completion_tasks
+from src.parsing import task_join_internal, parse_alias, parse_file, parse_line, parse_stream, parse_tables, \
+    expand_url_shorthands, RowFilter, ALIAS_EVENT, DATE_EVENT, ROW_EVENT, TODO_EVENT
+from src import lite, loader
 
 
 @pytest.mark.parametrize(
@@ -118,8 +122,9 @@ def test_parse_alias_expressions(line, des_alias, des_urls, des_posfix, des_orde
         ("#2001 01 01       \ntask1:: blah", "2001-01-01"),
     ],
 )
-def test_parse_date(file_content, des_date):
-    df, _, _, _, _ = parse_file(file_content)
+def test_parse_date(engine, file_content, des_date):
+    df, _, _, _, _ = engine.parse_file(file_content)
+    df = engine.frame(df)
     assert 1 == df.shape[0]
     assert df.iloc[0]["Date"] == datetime.strptime(des_date, '%Y-%m-%d')
 
@@ -149,15 +154,21 @@ def test_parse_date(file_content, des_date):
                 "update", None
         ),
         # update with pending:
-        ("# 2001-01-01\ntask1:: update last (!)", "task1", "update last (!)", "PENDING")
+        ("# 2001-01-01\ntask1:: update last (!)", "task1", "update last (!)", "PENDING"),
+        # alias redefined after its first use (the last definition applies):
+        ("# 2001-01-01\n[T1] task1::\nT1:: update\n[T1] task2::", "task2", "update", None),
+        # pending postfix:
+        ("# 2001-01-01\n[T1] task1:: POSTFIX<(!)>\nT1:: update (.)", "task1", "update (!)", "PENDING"),
     ],
 )
-def test_parse_alias_replacements(file_content, des_task, des_update, des_done):
-    df, _, _, _, _ = parse_file(file_content)
+def test_parse_alias_replacements(engine, file_content, des_task, des_update, des_done):
+    df, _, _, _, _ = engine.parse_file(file_content)
+    df = engine.frame(df)
     assert 1 == df.shape[0]
     assert df.iloc[0]["Task"] == des_task
     assert df.iloc[0]["Update"] == des_update
-    assert df.iloc[0]["Done"] == des_done
+    done = df.iloc[0]["Done"]  # (categorical, open updates have no state)
+    assert (None if pd.isna(done) else done) == des_done
 
 
 @pytest.mark.parametrize(
@@ -217,22 +228,23 @@ task1:: task1sub1:: update 1-1_1
         ),
     ],
 )
-def test_parse_completion(lines, des_open_tasks, des_standby_tasks, des_pending_tasks):
+def test_parse_completion(engine, lines, des_open_tasks, des_standby_tasks, des_pending_tasks):
     def check(df, des):
+        df = engine.frame(df)
         assert len(des) == df.shape[0]
         i = 0
         for t in des:
             assert t == df.iloc[i]["Task"]
             i += 1
 
-    df, _, _, _, _ = parse_file(lines)
-    df2 = completion_tasks(df, None)  # open
-    print(df[["Task","Done"]])
-    print(df2[["Task","Done"]])
+    df, _, _, _, _ = engine.parse_file(lines)
+    df2 = engine.reports.completion_tasks(df, None)  # open
+    print(engine.frame(df)[["Task","Done"]])
+    print(engine.frame(df2)[["Task","Done"]])
     check(df2, des_open_tasks)
-    df2 = completion_tasks(df, "STANDBY")  # open
+    df2 = engine.reports.completion_tasks(df, "STANDBY")  # open
     check(df2, des_standby_tasks)
-    df2 = completion_tasks(df, "PENDING")  # open
+    df2 = engine.reports.completion_tasks(df, "PENDING")  # open
     check(df2, des_pending_tasks)
 
 
@@ -242,3 +254,130 @@ def show(str):
     print(str)
     print("=========================")
     print("=========================")
+
+
+def test_parse_stream():
+    lines = iter(["[T1] task1:: ORDER<z>", "# 2001-01-01", "T1:: update", "#TODO something", "task2:: done (.)"])
+    events = parse_stream(lines)
+    assert next(events) == (ALIAS_EVENT, "T1", "task1", None, None, "z")
+    assert next(events) == (DATE_EVENT, date(2001, 1, 1))
+    assert next(events) == (ROW_EVENT, date(2001, 1, 1), "T1", "update", None)
+    assert list(events) == [(TODO_EVENT, "#TODO something"), (ROW_EVENT, date(2001, 1, 1), "task2", "done", "DONE")]
+
+
+@pytest.mark.parametrize(
+    "update,des_update",
+    [
+        ("see doc:https://x.com/a_(b) now.", "see [doc](https://x.com/a_(b)) now."),
+        ("doc:www.x.com/a.", "[doc](www.x.com/a)."),
+        ("doc:docs.google.com/d(e(f)g).", "[doc](docs.google.com/d(e(f)g))."),
+        ("a:b:http://x.com/p:q", "[a:b](http://x.com/p:q)"),
+        ("w:http://x.com/a)b c:ftp://x", "[w](http://x.com/a))b c:ftp://x"),
+        ("(see doc:www2.x.org/a)", "(see [doc](www2.x.org/a))"),
+        ("x:http://x.com/(a", "[x](http://x.com/)(a"),
+        ("x:http://a", "x:http://a"),
+        ("x:www1234.a.com", "x:www1234.a.com"),
+        ("time 10:30 and d:e.com/f:", "time 10:30 and d:e.com/f:"),
+    ],
+)
+def test_url_shorthands(update, des_update):
+    assert expand_url_shorthands(update) == des_update
+
+
+def test_url_adversarial():
+    # lines that took exponential time with the former URL regex (see bench/bench_url.py)
+    n = 300
+    updates = ["x:http://" + ".,;" * n, "x:www." + "." * n, "x:http://a" + "(b(c)" * n + "(", "a:" * n + "b"]
+    t0 = time.perf_counter()
+    for update in updates:
+        assert expand_url_shorthands(update) == update
+        assert parse_alias(f"[A] task:: {update[2:]}")[2] is None
+    assert time.perf_counter() - t0 < 1
+
+
+ROW_FILTER_CONTENT = """[T1] task1:: POSTFIX<weekly sync>
+# 2001-01-05
+T1:: update 5
+task2:: sub:: update 5b
+# 2001-01-04
+task1:: update 4 (.)
+T2:: update 4b
+# 2001-01-03
+task1:: update 3
+task2:: update 3b (!)
+[T2] task2::
+# 2001-01-01
+T1:: update 1
+"""
+
+
+@pytest.mark.parametrize(
+    "startdate,enddate,task,substring,des_parsed",
+    [
+        (date(2001, 1, 3), date(2001, 1, 4), None, None, 4),
+        (None, None, "T1", None, 5),
+        (None, None, "task2", None, 3),
+        (None, None, "task2 / sub", None, 3),
+        (date(2001, 1, 4), None, "task2", None, 3),
+        (None, None, None, "update 3", 2),
+        (None, None, None, "y sync", 7),
+        (None, None, "T1", "5 weekly", 5),
+        (None, None, None, "[x]", 7),
+    ],
+)
+def test_row_filter(engine, startdate, enddate, task, substring, des_parsed):
+    df, todos, postfixes, date_ascending, aliases, _, _, _ = engine.parse_tables(ROW_FILTER_CONTENT)
+    row_filter = RowFilter(startdate, enddate, task, substring)
+    df2, todos2, postfixes2, date_ascending2, aliases2, _, _, _ = engine.parse_tables(ROW_FILTER_CONTENT, row_filter)
+    df, df2 = engine.frame(df), engine.frame(df2)
+    assert (todos2, postfixes2, date_ascending2, aliases2) == (todos, postfixes, date_ascending, aliases)
+
+    def matching(df):
+        if startdate:
+            df = df[df.Date >= str(startdate)]
+        if enddate:
+            df = df[df.Date <= str(enddate)]
+        if task:
+            targets = row_filter.targets(aliases)
+            df = df[df.Task.isin(targets)]
+        if substring:
+            df = df[df.Update.str.contains(substring, regex=False)]
+        return df[["Date", "Task", "Update", "Done"]].astype(str).values.tolist()
+
+    assert matching(df2) == matching(df)
+    assert len(df2) == des_parsed  # (pending marks are always parsed)
+
+
+UNUSED_ALIASES_CONTENT = """[T1] task1::
+[T3] task3::
+[T4] task4:: sub::
+[T5] task5::
+# 2001-01-05
+T5:: update 5
+# 2001-01-03
+task4 :: sub:: update 4
+T3:: sub:: update 3
+# 2001-01-01
+T1:: update 1
+"""
+
+
+@pytest.mark.parametrize("row_filter", [
+    None,
+    RowFilter(date(2001, 1, 5), date(2001, 1, 5)),
+    RowFilter(date(2001, 1, 2), None, "T5"),
+    RowFilter(None, None, None, "update 5"),
+])
+def test_unused_aliases(row_filter, capsys, tmp_path):
+    # aliases used only by the updates rejected by a row filter are still used:
+    des_warning = "WARNING: UNUSED ALIASES: [T3]\n"
+    parse_file(UNUSED_ALIASES_CONTENT, row_filter)
+    assert capsys.readouterr().out == des_warning
+    lite.parse_file(UNUSED_ALIASES_CONTENT, row_filter)
+    assert capsys.readouterr().out == des_warning
+    filename = tmp_path / "updates.txt"
+    filename.write_text(UNUSED_ALIASES_CONTENT)
+    loader.load([str(filename)], row_filter=row_filter)
+    assert capsys.readouterr().out == des_warning
+    parse_tables(UNUSED_ALIASES_CONTENT, row_filter=row_filter)
+    assert capsys.readouterr().out == ""
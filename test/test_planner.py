@@ -0,0 +1,106 @@
+import os
+from datetime import datetime
+
+import pytest
+
+from src import planner, reports
+from src.parsing import parse_tables
+
+FILE_CONTENT = """
+[T1] task1::
+# 2001-01-10
+T1:: update 10 (!)
+task2:: update 10
+# 2001-01-09
+task3:: update 9 (.)
+# 2001-01-02
+T1:: update 2
+task2:: update 2
+#TODO todo 2
+"""
+
+NOW = datetime(2001, 1, 10)
+
+
+def test_compile_plan():
+    plan = planner.compile_plan(["y", "3w", "week", "span", "2001-01-01", "2001-01-05", "o", "tr", "bogus"])
+    assert plan == [
+        ("yesterday", ()),
+        ("lastweek", (3,)),
+        ("lastweek", (1,)),
+        ("span", (datetime(2001, 1, 1), datetime(2001, 1, 5))),
+        ("open", ()),
+        ("tasks_recent", ()),
+        ("unknown", ("bogus",)),
+    ]
+    with pytest.raises(SystemExit):
+        planner.compile_plan(["span", "2001-01-01"])
+
+
+@pytest.mark.parametrize(
+    "commands,des_span",
+    [
+        (["today", "y"], ("2001-01-09", "2001-01-10")),
+        (["thisweek", "span", "2000-12-01", "2000-12-02"], ("2000-12-01", "2001-01-14")),
+        (["today", "open"], None),
+        (["today", "all"], None),
+        ([], None),
+    ],
+)
+def test_plan_span(commands, des_span):
+    span = planner.plan_span(planner.compile_plan(commands), NOW)
+    assert span == (des_span and tuple(datetime.strptime(d, "%Y-%m-%d").date() for d in des_span))
+
+
+def run(monkeypatch, commands, data):
+    outputs = []
+    monkeypatch.setattr(planner.renderer, "printAndCopy",
+                        lambda txt, title=None, limit=None: outputs.append((title, "".join(txt))))
+    df, todos, postfixes = parse_tables(FILE_CONTENT)[:3]
+    planner.run_plan(planner.compile_plan(commands), data or reports.as_dataset(df), todos, postfixes, NOW)
+    return outputs
+
+
+def test_run_plan(monkeypatch):
+    df = parse_tables(FILE_CONTENT)[0]
+    data = reports.as_dataset(df)
+    outputs = run(monkeypatch, ["pending", "open", "y", "thisweek", "closed", "todo"], data)
+    assert [title for title, _ in outputs] == [
+        "SPAN: All", "OPEN TASKS", "TODO", "Tuesday 2001-01-09:", "TODO", "This Week #2: 2001 / 1 / 8-14", "TODO",
+        "CLOSED TASKS", "TODO"]
+    assert "Update 10 (!)" in outputs[0][1] and "Update 2" not in outputs[0][1]
+
+    # steps do not change the data seen by the following ones:
+    assert outputs[1] == run(monkeypatch, ["open"], None)[0]
+    assert outputs[5:7] == run(monkeypatch, ["thisweek"], None)[:2]
+
+    # span reports are served from the rows of their covering span, sorted once:
+    assert data.by_task(NOW, NOW).equals(df[df.Date == NOW].sort_values("TaskId", kind="stable"))
+
+
+def test_weekly_range(monkeypatch, tmp_path):
+    df = parse_tables(FILE_CONTENT)[0]
+    data = reports.as_dataset(df)
+    weeks = reports.report_weeks(data, datetime(2000, 12, 27), datetime(2001, 1, 10))
+    assert [monday.day for monday, _, _ in weeks] == [25, 1, 8]
+    for monday, title, txt in weeks:
+        des_title, des_txt = reports.report_this_week(df, monday)
+        assert (title, txt) == (des_title.replace("This Week", "Week"), des_txt)
+
+    output_dir = str(tmp_path / "weeks")
+    planner.run_plan(planner.compile_plan(["weekly-range", "2001-01-01", "2001-01-10"]), data, [], {}, NOW, output_dir)
+    assert sorted(os.listdir(output_dir)) == ["week_2001-W01.md", "week_2001-W02.md"]
+    with open(os.path.join(output_dir, "week_2001-W02.md")) as file:
+        assert file.read().startswith("*Week #2: 2001 / 1 / 8-14*\n")
+
+
+@pytest.mark.parametrize("commands", [["y"], ["todo"]])
+def test_run_plan_limit(monkeypatch, capsys, commands):
+    # --limit applies to the TODO lists too:
+    monkeypatch.setattr(planner.renderer, "write_to_clipboard", lambda string: None)
+    df, _, postfixes = parse_tables(FILE_CONTENT)[:3]
+    todos = [f"todo {i}" for i in range(20)]
+    planner.run_plan(planner.compile_plan(commands), reports.as_dataset(df), todos, postfixes, NOW, limit=5)
+    lines = capsys.readouterr().out.splitlines()
+    assert [line for line in lines if line.startswith("todo")] == [f"todo {i}" for i in range(5)]
+    assert "..." in lines
@@ -1,5 +1,8 @@
+import io
+
 import pytest
 
+from src import renderer
 from src.renderer import Renderer_md
 from src.reports import BULLET
 
@@ -24,3 +27,44 @@ def test_render(title, txt, des_md, des_md_slack):
     r = Renderer_md(markdown_type="slack")
     res = r.render(title, txt, display=False)
     assert res == des_md_slack
+
+
+def test_console_headline(monkeypatch, tmp_path):
+    monkeypatch.setattr(renderer.sys, "stdin", open(tmp_path / "stdin", "w"))
+    monkeypatch.setattr(renderer.os, "get_terminal_size", lambda fd: renderer.os.terminal_size((42, 10)))
+    renderer.terminal_cols.cache_clear()
+    try:
+        txt = renderer.Renderer_console().render("TITLE", "text", display=False)
+        assert txt.startswith("\n" + renderer.Renderer_console.bold_str + "_" * 42 + renderer.Renderer_console.end_str)
+        monkeypatch.setattr(renderer.os, "get_terminal_size", None)
+        assert renderer.Renderer_console().render("TITLE", "text", display=False) == txt  # (probed once)
+    finally:
+        renderer.terminal_cols.cache_clear()
+
+
+def test_print_and_copy(monkeypatch):
+    copied = []
+    monkeypatch.setattr(renderer, "write_to_clipboard", copied.append)
+    txt = f"{BULLET}task:\n{BULLET}update 1\n{BULLET}update 2\n"
+    out = io.StringIO()
+    renderer.printAndCopy(txt, "TITLE", out=out)
+    assert out.getvalue() == renderer.Renderer_console().render("TITLE", txt, display=False) + "\n"
+    assert copied == [renderer.Renderer_console_plain().render("TITLE", txt, display=False)]
+
+    # lines are written as they are produced, and no more are produced after the limit:
+    produced = []
+
+    def lines():
+        for line in txt.splitlines(keepends=True):
+            produced.append(line)
+            assert out.getvalue().count("\n") == len(produced) + 3  # (after the head)
+            yield line
+
+    out = io.StringIO()
+    renderer.printAndCopy(lines(), "TITLE", out=out)
+    assert copied[1] == copied[0]
+    out = io.StringIO()
+    produced.clear()
+    renderer.printAndCopy(lines(), "TITLE", limit=1, out=out)
+    assert len(produced) == 2
+    assert copied[2] == renderer.Renderer_console_plain().render("TITLE", f"{BULLET}task:\n...\n", display=False)
@@ -1,11 +1,16 @@
+import sys
+from datetime import datetime
+
+import pytest
+
 from src import reports, reporttree
-from src.parsing import parse_file
+from src.parsing import parse_tables
 
 bold = "\x1b[1m"
 endbold = "\x1b[0m"
 
 
-def test_write_reporttree_old():
+def test_write_reporttree_old(engine):
     file_content = """
 #2022-07-21
 TITLE A:: title AA:: update text here 1
@@ -13,8 +18,8 @@ TITLE A:: title AB:: update text here 2.
 TITLE A:: title AB:: title ABA:: update text here 3!
 TITLE B:: update text here
 """
-    df, _, _, _, _ = parse_file(file_content)
-    title, tree, updates = reports.report_span(df, None, None)
+    df, _, _, _, _ = engine.parse_file(file_content)
+    title, tree, updates = engine.reports.report_span(df, None, None)
     # TODO: test tress here
 
     rep = reporttree.write_reporttree(tree, updates, reports.BULLET, reports.BULLET2, oldformat=True)
@@ -28,7 +33,7 @@ TITLE B:: update text here
         assert a == d
 
 
-def test_write_reporttree():
+def test_write_reporttree(engine):
     file_content = """
 #2022-07-21
 Title A:: title AA:: update text here 1
@@ -36,8 +41,8 @@ Title A:: title AB:: update text here 2.
 Title A:: title AB:: title ABA:: update text here 3!
 Title B:: update text here 4
 """
-    df, _, _, _, _ = parse_file(file_content)
-    title, tree, updates = reports.report_span(df, None, None)
+    df, _, _, _, _ = engine.parse_file(file_content)
+    title, tree, updates = engine.reports.report_span(df, None, None)
     # TODO: test tress here
 
     rep = reporttree.write_reporttree(tree, updates, reports.BULLET, reports.BULLET2, oldformat=False)
@@ -54,3 +59,146 @@ Title B:: update text here 4
 """.replace("T", bold + "T").replace(":", endbold + ":")  # each individual task linke in bold
     for (a, d) in zip(rep.split("\n"), des.split("\n")):
         assert a == d
+
+
+
+@pytest.mark.parametrize("oldformat", [False, True])
+def test_write_reporttree_deep(oldformat):
+    depth = 3 * sys.getrecursionlimit()
+    task = "::".join(f"t{i}" for i in range(depth))
+    tree, updates = reporttree.task_tree([(task, "deep", None), ("t0", "top", "DONE")])
+    rep = reporttree.write_reporttree(tree, updates, "* ", "o ", oldformat=oldformat)
+    if oldformat:
+        assert rep.splitlines() == [f"* {bold}T0{endbold}: Top  ✓.", f"* {reporttree.format_task(task)}: Deep."]
+    else:
+        lines = rep.splitlines()
+        assert len(lines) == depth + 2
+        assert lines[:3] == [f"* {bold}T0{endbold}:", "  o Top  ✓.", f"  * {bold}T1{endbold}:"]
+        assert lines[-1] == "  " * depth + "o Deep."
+
+
+LATEST_STATE_CONTENT = """
+[T1] task1::
+# 2001-01-04
+T1:: update 4 (.)
+task3:: update 4 (,)
+# 2001-01-03
+task2:: update 3
+task3:: update 3
+task4:: update 3 (!)
+# 2001-01-02
+T1:: update 2
+task2:: update 2 (,)
+# 2001-01-01
+T1:: update 1
+task5:: update 1
+"""
+
+
+def test_latest_state_index(engine):
+    df = engine.parse_tables(LATEST_STATE_CONTENT)[0]
+    data = engine.dataset(df)
+    frame = engine.frame(df)
+    for today in (None, datetime(2001, 1, 3), datetime(2001, 1, 1), datetime(2000, 1, 1)):
+        tmp = frame[frame.Date <= today] if today else frame
+        des = tmp.sort_values("Date", kind="stable").groupby("TaskId").tail(1)
+        for state in (None, "DONE", "STANDBY", "PENDING"):
+            des_state = des[des.Done.isnull()] if state is None else des[des.Done == state]
+            des_state = des_state.sort_values("Date", ascending=False, kind="stable")
+            assert engine.equals(data.completion_tasks(state, today), des_state)
+            assert engine.equals(engine.reports.completion_tasks(df, state, today, 2), des_state.head(2))
+
+    if engine.name == "pandas":
+        index = data.latest()
+        rows, dated_rows = index.Row.tolist(), data.latest(datetime(2001, 1, 3)).Row.tolist()
+        assert index.Updates.tolist() == [3, 2, 2, 1, 1]
+        assert [d.day for d in index.FirstDate] == [1, 3, 2, 3, 1]
+    else:
+        rows, dated_rows = data.latest(), data.latest(datetime(2001, 1, 3))
+    assert frame.Task.iloc[rows].tolist() == ["task1", "task3", "task2", "task4", "task5"]
+    assert dated_rows == [2, 3, 4, 5, 8]
+
+    tasks = engine.reports.report_tasks(data, {}, datetime(2001, 1, 5))
+    assert tasks.split("\n  * ")[1:] == [
+        "PENDING:\n          \ttask4\n",
+        "OPEN:\n          \ttask2\n          \ttask5\n",
+        "STANDBY:\n          \ttask3\n",
+        "CLOSED:\n[T1]      \ttask1\n",
+    ]
+
+
+@pytest.mark.parametrize("order", ["ascending", "descending", "unsorted"])
+def test_span_slices(engine, order):
+    blocks = [f"# 2001-01-{d:02d}\ntask{d % 3}:: update {d}\ntask{d % 2}:: update {d}b\n" for d in (1, 2, 3, 5, 8, 9)]
+    df = engine.parse_tables("".join(blocks if order == "ascending" else blocks[::-1]))[0]
+    if order == "unsorted":
+        df = engine.take(df, [3, 0, 7, 1, 11, 2, 4, 10, 5, 6, 8, 9])
+    data = engine.dataset(df)
+    frame = engine.frame(df)
+    for startdate, enddate in [(None, None), (1, 9), (2, 5), (4, 4), (5, 5), (None, 3), (6, None), (10, None)]:
+        startdate = startdate and datetime(2001, 1, startdate)
+        enddate = enddate and datetime(2001, 1, enddate)
+        des = frame
+        if startdate:
+            des = des[des.Date >= startdate]
+        if enddate:
+            des = des[des.Date <= enddate]
+        assert engine.equals(data.span(startdate, enddate), des)
+
+
+def report1_rows(df, groupby, display_key, display_done, display_date, sortby, ascending):
+    ret = ""
+    for name, group in df.sort_values(sortby, ascending=ascending).groupby(groupby, sort=False, observed=True):
+        tmp = "".join(
+            reports.format_line(row.Key, row.Task, row.Update, date=row.Date if display_date else None, done=row.Done,
+                                level=1, display_key=display_key, display_done=display_done, url=row.URL)
+            for _, row in group.iterrows()
+        )
+        ret += (reports.BULLET + str(name) + "\n" + tmp) if len(group) > 1 else tmp
+    return ret
+
+
+@pytest.mark.parametrize("groupby,sortby", [("Task", "Order"), ("Date", "Date"), ("Key", "Date")])
+@pytest.mark.parametrize("display", [(False, False, False), (True, True, True), (True, False, True)])
+def test_report1_lines(engine, groupby, sortby, display):
+    content = LATEST_STATE_CONTENT.replace("[T1] task1::", "[T1] task1:: http://test.com\n[T4] task4::")
+    df = engine.parse_tables(content)[0]
+    des = report1_rows(engine.frame(df), groupby, *display, sortby, True)
+    assert engine.reports.report1(df, groupby, *display, sortby=sortby, ascending=True) == des
+    assert engine.reports.report1(engine.take(df, []), groupby, *display, sortby=sortby) == ""
+
+
+STATS_CONTENT = """
+# 2001-01-01
+Proj:: A:: start a
+Proj:: B:: start b
+Other:: start
+# 2001-01-03
+Proj:: A:: parked (,)
+# 2001-01-06
+Proj:: A:: resumed
+Proj:: B:: done b (.)
+# 2001-01-08
+Proj:: A:: parked again (,)
+Other:: blocked (!)
+"""
+
+
+def test_task_stats():  # (pandas engine only, see planner.LITE_STEPS)
+    df = parse_tables(STATS_CONTENT)[0]
+    data = reports.as_dataset(df)
+    stats = data.task_stats(datetime(2001, 1, 10)).set_index("Task")
+    assert stats.Updates.to_dict() == {"Other": 2, "Proj::A": 4, "Proj::B": 2}
+    assert stats.StandbyDays.to_dict() == {"Other": 0, "Proj::A": 3 + 2, "Proj::B": 0}
+    assert stats.CycleDays.fillna(-1).to_dict() == {"Other": -1, "Proj::A": -1, "Proj::B": 5}
+    assert [d.day for d in stats.LastDate] == [8, 8, 6]
+
+    # (as of an earlier date:)
+    stats = data.task_stats(datetime(2001, 1, 4)).set_index("Task")
+    assert stats.StandbyDays.to_dict() == {"Other": 0, "Proj::A": 1, "Proj::B": 0}
+    assert stats.Done.isnull().tolist() == [False, False, True]
+
+    lines = reports.report_stats(data, datetime(2001, 1, 10)).split("\n")
+    assert lines[4].split() == ["Proj", "2", "0", "0", "1", "1", "6", "2001-01-01", "2001-01-08", "5d", "5d"]
+    assert lines[3].split() == ["Other", "1", "0", "1", "0", "0", "2", "2001-01-01", "2001-01-08", "-", "0d"]
+    assert [line.split()[:3] for line in lines[8:10]] == [["Proj", "/", "A"], ["Proj", "/", "B"]]
@@ -0,0 +1,80 @@
+import datetime
+
+import pytest
+
+from src import loader, search
+from src.parsing import RowFilter, parse_tables
+
+FILE_CONTENT = """
+[LG] Project-X:: Legal::
+# 2001-01-10
+LG:: contract signed with lawyers
+Project-X:: Recruiting:: contacted 20 candidates
+# 2001-01-09
+LG:: Contracts reviewed (.)
+Misc:: legal-ish question about contractors
+"""
+
+
+def test_parse_query():
+    assert search.parse_query("a B* OR c | d-e") == [[("a", False), ("b", True)], [("c", False)], [("d", False),
+                                                                                                   ("e", False)]]
+    assert search.parse_query("OR a OR") == [[("a", False)]]
+
+
+@pytest.mark.parametrize("query,des_rows", [
+    ("legal", [0, 2, 3]),
+    ("LEGAL contract", [0]),
+    ("legal contract*", [0, 2, 3]),
+    ("project-x contract*", [0, 2]),
+    ("lawyers OR candidates", [0, 1]),
+    ("contract* ish OR recruit*", [1, 3]),
+    ("nothing", []),
+    ("", []),
+])
+def test_search(query, des_rows):
+    df = parse_tables(FILE_CONTENT)[0]
+    index = search.InvertedIndex(df.Update, df.Task)
+    assert index.search(query) == des_rows
+
+
+def test_search_index_cache(tmp_path, monkeypatch):
+    filename = str(tmp_path / "updates.txt")
+    with open(filename, "w") as file:
+        file.write(FILE_CONTENT)
+    cache_dir = str(tmp_path / "cache")
+    df = parse_tables(FILE_CONTENT)[0]
+    index = loader.load_search_index(cache_dir, [filename], df)
+    assert index.search("legal") == [0, 2, 3]
+
+    tokenized = []
+    monkeypatch.setitem(loader.InvertedIndex.__init__.__globals__, "tokens",
+                        lambda text: tokenized.append(text) or search.tokens(text))
+    assert loader.load_search_index(cache_dir, [filename], df).postings == index.postings
+    assert tokenized == []
+
+    # changed file, only the new texts are tokenized:
+    content = FILE_CONTENT.replace("# 2001-01-10", "# 2001-01-11\nMisc:: new lawyer\n# 2001-01-10")
+    with open(filename, "w") as file:
+        file.write(content)
+    df = parse_tables(content)[0]
+    index = loader.load_search_index(cache_dir, [filename], df)
+    assert tokenized == ["new lawyer"]
+    assert index.search("lawyer*") == [0, 1]
+
+
+def test_search_index_filtered_loads(tmp_path):
+    # two filtered loads of the same files with as many rows: each is searched with an index of its own rows
+    filename = str(tmp_path / "updates.txt")
+    with open(filename, "w") as file:
+        file.write(FILE_CONTENT)
+    cache_dir = str(tmp_path / "cache")
+    full_index = loader.load_search_index(cache_dir, [filename], loader.load([filename])[0])
+    for day, des_updates in [(10, ["contract signed with lawyers"]),
+                             (9, ["Contracts reviewed", "legal-ish question about contractors"])]:
+        date = datetime.date(2001, 1, day)
+        df = loader.load([filename], None, None, RowFilter(date, date))[0]
+        assert len(df) == 2
+        index = loader.load_search_index(cache_dir, [filename], df, filtered=True)
+        assert df.Update.iloc[index.search("contract*")].tolist() == des_updates
+    assert loader.load_search_index(cache_dir, [filename], loader.load([filename])[0]).postings == full_index.postings
@@ -0,0 +1,79 @@
+import pytest
+
+from src import reports, reporttree
+from src.parsing import RowFilter, parse_tables
+
+FILE_CONTENT = """
+[PT] Project Two:: Infra::
+[DB] Project Two:: Infra:: Database::
+[PX] Project Ten::
+# 2001-01-10
+PT:: update 1
+DB:: update 2
+Project Two:: Docs:: update 3
+Project Two:: update 4
+PX:: update 5
+Project Two / Infra:: update 6
+# 2001-01-09
+Project Two:: Infra:: Database:: Backups:: update 7
+Project Twos:: update 8
+"""
+
+
+@pytest.mark.parametrize("task,des_updates", [
+    ("Project Two / Infra", [1, 2, 6, 7]),  # (also the task named "Project Two / Infra")
+    ("Project Two::Infra", [1, 2, 7]),
+    ("PT", [1, 2, 7]),
+    ("PT / Database", [2, 7]),
+    ("DB / Backups", [7]),
+    ("Project Two", [1, 2, 3, 4, 7]),
+    ("Project Two / Infra / Database / Backups", [7]),
+    ("Project", []),
+    ("PX", [5]),
+    ("Project Two / Infra:", []),
+])
+def test_filter_task(task, des_updates):
+    df, _, _, _, aliases = parse_tables(FILE_CONTENT)[:5]
+    data = reports.as_dataset(df)
+    updates = [int(update.split()[1]) for update in data.filter_task(task, aliases).df.Update]
+    assert updates == des_updates
+    assert data.filter_task(task).df.equals(data.filter_task(task, aliases).df)
+
+    # pushed down into the parser:
+    df = parse_tables(FILE_CONTENT, row_filter=RowFilter(task=task))[0]
+    assert reports.as_dataset(df).filter_task(task, aliases).df.Update.tolist() == \
+           [f"update {update}" for update in des_updates]
+
+
+def test_trie():
+    df = parse_tables(FILE_CONTENT)[0]
+    trie = reports.as_dataset(df).task_trie()
+    assert sorted(trie.children(0)) == ["Project Ten", "Project Two", "Project Two / Infra", "Project Twos"]
+    assert sorted(trie.children(trie.node("Project Two"))) == ["Docs", "Infra"]
+    assert trie.children(trie.node("Project Two::Infra::Database::Backups")) == {}
+    assert trie.name(trie.node("Project Two::Infra")) == "Infra"
+    assert trie.tasks[trie.node("Project Two::Infra")] == "Project Two::Infra"
+    assert trie.node("Project Two::Nothing") is None
+    assert trie.keys == {"PT": "Project Two::Infra", "DB": "Project Two::Infra::Database", "PX": "Project Ten"}
+    assert len(trie.nodes) == len(trie.task_ids("Project Two")) + 3 == len(df.Task.unique())
+
+
+@pytest.mark.parametrize("oldformat", [False, True])
+def test_interleaved_reports(oldformat):
+    df = parse_tables(FILE_CONTENT)[0]
+    trie = reports.as_dataset(df).task_trie()
+    spans = [sorted(zip(span.TaskId.tolist(), span.Update, span.Done), key=lambda row: row[0])
+             for _, span in df.groupby("Date")]
+    des_txts = [reporttree.write_reporttree(*reporttree.span_tree(trie, rows), "* ", "o ", oldformat) for rows in spans]
+    # the report of the second span is built and written while the first one is being written:
+    lines = reporttree.iter_reporttree(*reporttree.span_tree(trie, spans[0]), "* ", "o ", oldformat)
+    txt = next(lines)
+    other_txt = reporttree.write_reporttree(*reporttree.span_tree(trie, spans[1]), "* ", "o ", oldformat)
+    assert [txt + "".join(lines), other_txt] == des_txts
+    assert len(des_txts[0].splitlines()) > 1
+
+
+def test_report_log():
+    df = parse_tables(FILE_CONTENT)[0]
+    log = reports.report_log(df, "DB")
+    assert [line.split(": ")[-1].split(" (")[0] for line in log.splitlines()] == ["update 7", "update 2"]